@@ -1,16 +1,39 @@
-from dataclasses import asdict
+import argparse
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
 from functools import partial
+from http import HTTPStatus
 import json
+import math
 import os
+from pathlib import Path
 import sys
+import time
 
 from serial import Serial, SerialException
 import asyncio
+from websockets.exceptions import ConnectionClosed
 from websockets.server import serve, WebSocketServerProtocol
 
-from src.relay import ReceiveState, Relay
+from src.broadcast import BroadcastHub, DropPolicy, Subscriber
+from src.calibration import CalibrationFile
+from src.capture import CaptureSerial, ReplaySerial, capture_path
+from src.link import LinkMonitor
+from src.metrics import Metrics
+from src.pipeline import OverflowPolicy, QueueMetrics, StageQueue, Worker
+from src.receivers import Receiver, ReceiverStatistics
+from src.reorder import ReorderBuffer
+from src.rolling import RollingStatistics
+from src.segments import SegmentPolicy
+from src.serial_reader import READ_TIMEOUT_SECONDS
 from src.data import Vector, Data, DropData
+from src.decimation import DecimationMode, Decimator
+from src.history import History
 from src.directory import Directory
+from src.timestamps import TimestampWindow
+from src.uplink import Acknowledgement, Command, CommandStatus, Uplink
+from src.wire import BINARY_SUBPROTOCOL, SUBPROTOCOLS, Sample, encode_batch, schema_message
+from src.writer import FlushPolicy
 
 commands = {
     'Accelerometer': 0,
@@ -36,28 +59,107 @@ enabled_sensors = {
     'DHT outside': True
 }
 
-websocketDelay = 500
-
-accelerationCoefficients = {
-    'x': { 'k': 0.9852, 'm': -0.0049 },
-    'y': { 'k': 1.0000, 'm': 0.0300 },
-    'z': { 'k': 1.0363, 'm': -0.0466 }
-}
-gyroscopeOffset = Vector(
-    x=-1.4647,
-    y=-0.8470,
-    z=-1.2042
+# The rate at which samples are sent to each client unless it asks for
+# something else, in points per second per channel.
+defaultDecimationMode = DecimationMode.MINMAX
+defaultPointsPerSecond = 2
+# Buckets shorter than the 1 ms resolution of the CanSat time make no sense.
+maxPointsPerSecond = 1000
+# Decimation buckets are only released by the next sample. When no sample
+# was published for this many seconds, for example after a stall or at the
+# end of the flight, the clients get the points held back so far.
+decimationFlushDelay = 1.0
+
+# Clients that connect during a session first get the samples of the last
+# historyDuration milliseconds, reduced to historyPointsPerSecond, sent in
+# messages of at most historyMessageSize samples.
+historyDuration = 1000 * 60 * 10
+historyPointsPerSecond = 2
+historyMessageSize = 1000
+
+# Sizes of the queues between the pipeline stages. The serial queue holds
+# received chunks, the frame queue decoded frames and the persistence queue
+# rows waiting to be written. Reading and decoding wait when their queue is
+# full, while persistence follows persistenceOverflowPolicy.
+serialQueueSize = 256
+frameQueueSize = 1024
+persistenceQueueSize = 10000
+persistenceOverflowPolicy = OverflowPolicy.BLOCK
+
+# Messages waiting for each client before the drop policy kicks in.
+subscriberQueueSize = 64
+subscriberDropPolicy = DropPolicy.OLDEST
+# Samples that are sent together to clients using the binary protocol.
+maxSamplesPerMessage = 32
+
+directoryFlushPolicy = FlushPolicy(
+    max_rows=256,
+    max_delay_seconds=1.0,
+    sync_interval_seconds=10.0
+)
+# Long sessions, like soak tests before a launch, are written as CSV segments
+# of at most max_rows rows or max_seconds seconds that are gzipped once
+# finished.
+directorySegmentPolicy = SegmentPolicy(
+    max_rows=100000,
+    max_seconds=600.0,
+    compression_level=6
 )
-insideTemepratureCoefficients = { 'k': 0.9921, 'm': -0.5465 }
-insideHumidityCoefficients = { 'k': 0.9072, 'm': -0.2948 }
-outsideHumidityCoefficients = { 'k': 0.9458, 'm': 2.3840 }
 
-received_timestamps = []
+# How often the calibration file is checked for changes.
+calibrationReloadInterval = 1.0
+calibration_file: CalibrationFile = None
+
+# Rolling statistics over the last samples of every channel. Values further
+# than the threshold in standard deviations from the mean are reported.
+rolling_statistics = RollingStatistics(window=200, threshold=4.0)
+# How often the statistics are sent to the clients, in seconds.
+statisticsInterval = 1.0
+
+# Counters and latency histograms of every stage, served as JSON on
+# http://localhost:8765/metrics.
+metrics = Metrics()
+metricsPath = '/metrics'
+
+# Loss, jitter and corruption of the radio link, reported to the clients and
+# the log. A link losing more than poorLinkLoss of the recent frames is worth
+# moving to another radio channel.
+link_monitor = LinkMonitor(metrics, window=500)
+linkReportInterval = 5.0
+poorLinkLoss = 0.2
+
+# Commands are sent one at a time and sent again up to uplinkRetries times
+# when the CanSat does not acknowledge them within uplinkTimeout seconds.
+# Sensors are only enabled or disabled once the CanSat acknowledged it.
+uplinkTimeout = 0.5
+uplinkRetries = 3
+uplinkQueueSize = 32
+uplink: Uplink = None
+
+# Reject DATA and DROP frames without a checksum from the start, instead of
+# only after the first checked frame, when every ground station sends them.
+requireChecksum = False
+
+# Frames kept from and duplicates dropped for each receiver, set when the
+# station starts.
+receiver_statistics: ReceiverStatistics = None
+
+# Duplicates are detected among the timestamps received during this many
+# milliseconds before the newest one.
+duplicateWindow = 1000 * 60
+
+# Frames are held for up to reorderHold seconds so that frames the radio
+# delivered out of order are saved and sent sorted by time. With several
+# receivers this also merges their frames into one stream sorted by CanSat
+# time. Frames arriving after a newer frame was released are discarded. 0
+# passes frames on in the order they arrive.
+reorderHold = 0.1
+reorder_buffer = ReorderBuffer(reorderHold)
+
+received_timestamps = TimestampWindow(duplicateWindow)
 first_received_timestamp: float = None
 latest_received_timestamp: float = None
 
-latest_sent_timestamp: float = None
-
 
 def detect_strange_acceleration(acceleration: Vector) -> bool:
     max_value = 2 * 9.82
@@ -141,12 +243,81 @@ def detect_strange_data(data: Data) -> bool:
     )
 
 
+def validate_received_time(received_time: int) -> bool:
+    if received_time < 0:
+        # Abort if the timestamp is negative.
+        print('[ERROR] Received timestamp is negative.')
+        metrics.reject('negative_time')
+        return False
+    if received_time in received_timestamps:
+        # Abort if the data has already been received.
+        print('[ERROR] Data with the same timestamp has already been received.')
+        metrics.reject('duplicate')
+        return False
+    if received_timestamps.is_expired(received_time):
+        # Abort if the data is too old to tell whether it is a duplicate.
+        print('[ERROR] Received data is too old to check for duplicates.')
+        metrics.reject('too_old')
+        return False
+
+    if latest_received_timestamp:
+        time_since_first_receive = received_time - first_received_timestamp
+        if time_since_first_receive < 0:
+            # Abort if the data is older than the oldest.
+            # This might mess up the first few values if they are
+            # sent out of order, but that is an okay drawback.
+            print('[ERROR] Received data is older than the oldest data.')
+            metrics.reject('older_than_first')
+            return False
+
+        time_since_latest_receive = received_time - latest_received_timestamp
+        if time_since_latest_receive > 1000 * 60 * 10:
+            # Abort the data is more than 10 minutes older than the
+            # newest data.
+            print('[ERROR] Received data is more than 10 minutes older than the newest data.')
+            metrics.reject('too_far_ahead')
+            return False
+
+    return True
+
+
+# Whether another receiver already delivered a frame with this timestamp. A
+# slower receiver's copy can arrive after the timestamp left the duplicate
+# window, it is counted as a duplicate rather than as too old so the
+# receiver's loss is not overstated.
+def is_duplicate(received_time: int) -> bool:
+    if received_time in received_timestamps:
+        return True
+    return received_timestamps.is_expired(received_time) and received_time <= received_timestamps.latest
+
+
+# Keeps the first good copy of a frame when several receivers hear the
+# CanSat, validates the timestamp and checks that the frame can still be put
+# in order. Returns whether to process the frame.
+def accept_frame(received_time: int, receiver: str) -> bool:
+    if receiver_statistics.multiple and is_duplicate(received_time):
+        receiver_statistics.add_duplicate(receiver)
+        return False
+
+    if not validate_received_time(received_time):
+        return False
+
+    # Before the frame counts as received anywhere.
+    if not reorder_buffer.admit(received_time):
+        print('[ERROR] Received data arrived too late to be put in order.')
+        metrics.reject('late')
+        return False
+
+    receiver_statistics.add_first(receiver)
+    return True
+
+
 def update_received_time(timestamp: float):
     global received_timestamps
     global first_received_timestamp
     global latest_received_timestamp
 
-    received_timestamps.append(timestamp)
+    received_timestamps.add(timestamp)
 
     if first_received_timestamp is None:
         first_received_timestamp = timestamp
@@ -157,17 +328,8 @@ def update_received_time(timestamp: float):
         latest_received_timestamp = max(timestamp, latest_received_timestamp)
 
 
-def update_send_time(timestamp: float):
-    global latest_sent_timestamp
-
-    if latest_sent_timestamp is None:
-        latest_sent_timestamp = timestamp
-    else:
-        latest_sent_timestamp = max(timestamp, latest_sent_timestamp)
-
-
 def startTimeFromZero(data: Data | DropData):
-    data.time -= received_timestamps[0]
+    data.time -= received_timestamps.first
 
 
 def ignore_disabled_sensors_in_data(data: Data):
@@ -197,261 +359,512 @@ def ignore_disabled_sensors_in_drop_data(data: DropData):
         data.gyroscope = None
 
 
-def convertAccelerometer(data: Data):
-    if data.acceleration is not None:
-        kX = accelerationCoefficients['x']['k']
-        kY = accelerationCoefficients['y']['k']
-        kZ = accelerationCoefficients['z']['k']
+def process_data(data: Data):
+    calibration_file.calibration.apply(data)
 
-        mX = accelerationCoefficients['x']['m']
-        mY = accelerationCoefficients['y']['m']
-        mZ = accelerationCoefficients['z']['m']
 
-        data.acceleration.x = kX * data.acceleration.x + mX
-        data.acceleration.y = kY * data.acceleration.y + mY
-        data.acceleration.z = kZ * data.acceleration.z + mZ
+def process_drop_data(data: DropData):
+    calibration_file.calibration.apply_drop(data)
 
-        data.acceleration.x *= 9.82
-        data.acceleration.y *= 9.82
-        data.acceleration.z *= 9.82
 
+def toggle_sensor(sensor: str, state: bool):
+    global enabled_sensors
 
-def removeGyroscopeOffset(data: Data):
-    if data.gyroscope is not None:
-        data.gyroscope -= gyroscopeOffset
+    enabled_sensors[sensor] = state
 
 
-def convertInsideTemperature(data: Data):
-    if data.temperature_inside is not None:
-        k = insideTemepratureCoefficients['k']
-        m = insideTemepratureCoefficients['m']
-        data.temperature_inside = k * data.temperature_inside + m
+def on_command_result(command: Command, status: CommandStatus, round_trip: float | None, hub: BroadcastHub):
+    if status is CommandStatus.ACKNOWLEDGED:
+        if command.name in enabled_sensors:
+            toggle_sensor(command.name, bool(command.value))
+        print(f'{command.name} set to {command.value} in {round_trip * 1000:.0f} ms.')
+    else:
+        print(f'[WARNING] {command.name} was not acknowledged after {command.attempts} attempts: {status.value}.')
+
+    hub.publish_status(json.dumps({
+        'type': 'command',
+        'action': command.name,
+        'value': command.value,
+        'status': status.value,
+        'attempts': command.attempts,
+        'round_trip_ms': round_trip * 1000 if round_trip is not None else None,
+        'enabled': enabled_sensors.get(command.name)
+    }))
+
+
+# Clients choose how their own stream is reduced with 'Decimation:<mode>' and
+# 'Rate:<points per second>'. These are not forwarded to the CanSat.
+def configure_decimation(subscriber: Subscriber, setting: str, value: str):
+    decimator: Decimator = subscriber.decimator
+    mode = decimator.mode
+    points_per_second = decimator.points_per_second
 
+    try:
+        if setting == 'Decimation':
+            mode = DecimationMode(value)
+        else:
+            points_per_second = float(value)
+            if not (math.isfinite(points_per_second) and 0 < points_per_second <= maxPointsPerSecond):
+                raise ValueError(f'Rate must be between 0 and {maxPointsPerSecond}: {value}')
+    except ValueError as error:
+        print(f'[ERROR] Invalid decimation setting: {error}')
+        return
 
-def convertInsideHumidity(data: Data):
-    if data.humidity_inside is not None:
-        k = insideHumidityCoefficients['k']
-        m = insideHumidityCoefficients['m']
-        data.humidity_inside = k * data.humidity_inside + m
+    # The open bucket of the old decimator would be lost otherwise.
+    subscriber.flush()
+    subscriber.decimator = Decimator(mode, points_per_second)
 
 
-def convertOutsideHumidity(data: Data):
-    if data.humidity_outside is not None:
-        k = outsideHumidityCoefficients['k']
-        m = outsideHumidityCoefficients['m']
-        data.humidity_outside = k * data.humidity_outside + m
+async def websocket_loop(websocket: WebSocketServerProtocol, subscriber: Subscriber):
+    async for message in websocket:
+        if ':' in message:
+            action, value = message.split(':')
+            if action in ('Decimation', 'Rate'):
+                configure_decimation(subscriber, action, value)
+                continue
+            await uplink.send(action, commands[action], int(value))
+        else:
+            print(message)
 
 
-def process_data(data: Data):
-    convertAccelerometer(data)
-    removeGyroscopeOffset(data)
+async def check_for_anomalies(data: Data | DropData, directory: Directory, persistence: Worker, hub: BroadcastHub):
+    anomalies = rolling_statistics.update(data)
+    if not anomalies:
+        return
 
-    convertInsideTemperature(data)
-    convertInsideHumidity(data)
-    convertOutsideHumidity(data)
+    for anomaly in anomalies:
+        print(f'[WARNING] Anomaly in {anomaly.channel} at {anomaly.time} ms: {anomaly.value:.3f} is {anomaly.score:.1f} standard deviations from the mean.')
 
+    await persistence.submit(directory.saveAnomalies, anomalies)
+    hub.publish_status(json.dumps({
+        'type': 'anomalies',
+        'anomalies': [asdict(anomaly) for anomaly in anomalies]
+    }))
 
-def process_drop_data(data: DropData):
-    convertAccelerometer(data)
-    removeGyroscopeOffset(data)
 
+# The station runs as a pipeline of stages connected by bounded queues:
+#   serial reader thread -> ingest_loop -> process_loop -> reorder buffer -> persistence thread
+#   (one per receiver)      (one per receiver)                             -> broadcast hub
+# so a slow disk or a slow client never holds up reading the serial ports.
+async def ingest_loop(receiver: Receiver, frames: StageQueue):
+    while True:
+        # Wake up now and then even without new bytes so that incomplete
+        # frames can time out.
+        receiver.relay.feed(await receiver.reader.read(timeout=READ_TIMEOUT_SECONDS))
 
-def removeNoneFromDictionary(dictionary: dict):
-    return {
-        key: value for key, value in dictionary.items()
-        if value is not None
-    }
+        received = time.perf_counter()
+        messages = receiver.relay.receive()
+        metrics.observe('decode', time.perf_counter() - received)
 
+        for message in messages:
+            await frames.put((received, receiver.name, message))
 
-def toggle_sensor(sensor: str, state: bool):
-    global enabled_sensors
 
-    enabled_sensors[sensor] = state
+# Frames are held by the time the CanSat sent them, before startTimeFromZero,
+# like accept_frame checks them.
+def hold_frame(received: float, received_time: int, data: Data | DropData):
+    reorder_buffer.add(received_time, (received, data), time.perf_counter())
 
 
-def sendCommand(serial: Serial, action: int, value: int):
-    serial.write('01'.encode())
-    serial.write(bytes([action, value]))
+# Saves and publishes a frame released by the reorder buffer.
+async def deliver_frame(received: float, data: Data | DropData, directory: Directory, persistence: Worker, hub: BroadcastHub):
+    if type(data) is Data:
+        await persistence.submit(directory.saveData, data)
+        await check_for_anomalies(data, directory, persistence, hub)
 
+        if detect_strange_data(data):
+            print('[WARNING] Strange date detected.')
+            metrics.increment('withheld', 'strange_data')
+        else:
+            hub.publish(Sample(data, received))
+    else:
+        await persistence.submit(directory.saveDropData, data)
+        await check_for_anomalies(data, directory, persistence, hub)
 
-async def websocket_loop(websocket: WebSocketServerProtocol, serial: Serial):
-    async for message in websocket:
-        if ':' in message:
-            action, value = message.split(':')
-            value = int(value)
-            if action in enabled_sensors:
-                toggle_sensor(action, bool(value))
-            sendCommand(serial, commands[action], value)
+        hub.publish(Sample(data, received))
+
+
+def process_message(received: float, receiver: str, message: Data | DropData | Acknowledgement | str):
+    match message:
+        case Data():
+            data = message
+
+            received_time = data.time
+
+            if not accept_frame(received_time, receiver):
+                return
+
+            update_received_time(received_time)
+            link_monitor.add('data', received_time, received)
+
+            startTimeFromZero(data)
+            ignore_disabled_sensors_in_data(data)
+            process_data(data)
+
+            hold_frame(received, received_time, data)
+
+        case DropData():
+            data = message
+
+            received_time = data.time
+
+            if not accept_frame(received_time, receiver):
+                return
+
+            update_received_time(received_time)
+            link_monitor.add('drop', received_time, received)
+
+            startTimeFromZero(data)
+            ignore_disabled_sensors_in_drop_data(data)
+            process_drop_data(data)
+
+            hold_frame(received, received_time, data)
+
+        case Acknowledgement():
+            uplink.acknowledge(message, received)
+
+        case str():
+            uplink.text(message, received)
+            if receiver_statistics.multiple:
+                print(f'{receiver}: {message}')
+            else:
+                print(message)
+
+
+async def process_loop(frames: StageQueue, directory: Directory, persistence: Worker, hub: BroadcastHub):
+    while True:
+        # Wake up now and then even without new frames so that held frames
+        # are released on time.
+        try:
+            received, receiver, message = await asyncio.wait_for(frames.get(), reorderHold / 2 or None)
+        except TimeoutError:
+            pass
         else:
-            print(message)
+            started = time.perf_counter()
+            metrics.observe('queue', started - received)
+            process_message(received, receiver, message)
+            metrics.observe('process', time.perf_counter() - started)
 
+        for received, data in reorder_buffer.release(time.perf_counter()):
+            started = time.perf_counter()
+            await deliver_frame(received, data, directory, persistence, hub)
+            metrics.observe('deliver', time.perf_counter() - started)
 
-async def serial_loop(websocket: WebSocketServerProtocol, serial: Serial, relay: Relay, directory: Directory):
-    global received_timestamps
 
-    while websocket.open:
-        await asyncio.sleep(0)
+async def calibration_loop():
+    while True:
+        await asyncio.sleep(calibrationReloadInterval)
+        if calibration_file.reload_if_changed():
+            print('Calibration reloaded.')
 
-        match relay.receive_state:
-            case ReceiveState.HEADER:
-                relay.try_receive_header()
 
-            case ReceiveState.TYPE:
-                relay.try_receive_type()
+async def decimation_flush_loop(hub: BroadcastHub):
+    while True:
+        await asyncio.sleep(decimationFlushDelay)
+        if hub.last_published is not None and time.perf_counter() - hub.last_published >= decimationFlushDelay:
+            hub.flush()
 
-            case ReceiveState.DATA:
-                data = relay.try_receive_data()
 
-                if not data:
-                    # Abort if there is no data.
-                    continue
+async def statistics_loop(hub: BroadcastHub, queues: list[QueueMetrics]):
+    while True:
+        await asyncio.sleep(statisticsInterval)
+        hub.publish_status(json.dumps({
+            'type': 'statistics',
+            'channels': rolling_statistics.summary(),
+            'anomaly_count': rolling_statistics.anomaly_count,
+            'queues': { metrics.name: metrics.summary() for metrics in queues },
+            'subscribers': hub.summary(),
+            'receivers': receiver_statistics.summary(),
+            'reorder': reorder_buffer.summary(),
+            'uplink': uplink.summary()
+        }))
 
-                received_time = data.time
 
-                if received_time < 0:
-                    # Abort if the timestamp is negative.
-                    print('[ERROR] Received timestamp is negative.')
-                    continue
-                if received_time in received_timestamps:
-                    # Abort if the data has already been received.
-                    print('[ERROR] Data with the same timestamp has already been received.')
-                    continue
+def is_poor_link(report: dict) -> bool:
+    return any(stream['recent_loss'] > poorLinkLoss for stream in report['streams'].values())
 
-                if latest_received_timestamp:
-                    time_since_first_receive = received_time - first_received_timestamp
-                    if time_since_first_receive < 0:
-                        # Abort if the data is older than the oldest.
-                        # This might mess up the first few values if they are
-                        # sent out of order, but that is an okay drawback.
-                        print('[ERROR] Received data is older than the oldest data.')
-                        continue
-
-                    time_since_latest_receive = received_time - latest_received_timestamp
-                    if time_since_latest_receive > 1000 * 60 * 10:
-                        # Abort the data is more than 10 minutes older than the
-                        # newest data.
-                        print('[ERROR] Received data is more than 10 minutes older than the newest data.')
-                        continue
-
-                update_received_time(received_time)
-
-                startTimeFromZero(data)
-                ignore_disabled_sensors_in_data(data)
-                process_data(data)
-
-                directory.saveData(data)
-
-                if (
-                        # Send if this is the first time sending.
-                        (not latest_sent_timestamp)
-                        # Send if the data contains temperature or humidity data.
-                        or (data.temperature_inside
-                        or data.temperature_outside
-                        or data.humidity_inside
-                        or data.humidity_outside)
-                        # Send if enough time has passed since the last data was sent.
-                        or (received_time - latest_sent_timestamp >= websocketDelay)
-                    ):
-                    if detect_strange_data(data):
-                        print('[WARNING] Strange date detected.')
-                    else:
-                        filtered_data = removeNoneFromDictionary(asdict(data))
-                        await websocket.send(json.dumps(filtered_data))
-                        update_send_time(received_time)
-
-            case ReceiveState.DROP:
-                data = relay.try_receive_drop_data()
-
-                if not data:
-                    # Abort if there is no data.
-                    continue
 
-                received_time = data.time
+async def link_loop(hub: BroadcastHub):
+    while True:
+        await asyncio.sleep(linkReportInterval)
+        report = link_monitor.report(time.perf_counter())
+        poor = is_poor_link(report)
 
-                if received_time < 0:
-                    # Abort if the timestamp is negative.
-                    print('[ERROR] Received timestamp is negative.')
-                    continue
-                if received_time in received_timestamps:
-                    # Abort if the data has already been received.
-                    print('[ERROR] Data with the same timestamp has already been received.')
+        for kind, stream in report['streams'].items():
+            rate = stream['packet_rate'] or 0
+            print(f"Link {kind}: {rate:.1f} frames/s, {stream['recent_loss']:.1%} lost, {stream['jitter_ms']:.1f} ms jitter, {stream['reordered']} reordered.")
+        if report['corrupted_per_second']:
+            print(f"Link: {report['corrupted_per_second']:.1f} corrupted frames/s, {report['discarded_bytes_per_second']:.0f} bytes/s discarded.")
+        if poor:
+            print('[WARNING] The radio link is losing many frames, consider changing the radio channel.')
+
+        hub.publish_status(json.dumps({ 'type': 'link', 'poor': poor, **report }))
+
+
+async def send_samples(websocket: WebSocketServerProtocol, samples: list[Sample], binary: bool):
+    if not samples:
+        return
+
+    started = time.perf_counter()
+    if binary:
+        message = encode_batch(samples)
+        await websocket.send(message)
+        metrics.increment('sent', 'messages')
+        metrics.increment('sent', 'bytes', len(message))
+    else:
+        for sample in samples:
+            message = sample.json()
+            await websocket.send(message)
+            metrics.increment('sent', 'messages')
+            metrics.increment('sent', 'bytes', len(message))
+
+    sent = time.perf_counter()
+    metrics.observe('send', sent - started)
+    metrics.increment('sent', 'samples', len(samples))
+    for sample in samples:
+        if sample.received is not None:
+            # From the serial port to the client, including decimation.
+            metrics.observe('delivery', sent - sample.received)
+
+
+# Sends the history before the live samples. The status message tells the
+# client to replace what it has, for example after reconnecting.
+async def send_history(websocket: WebSocketServerProtocol, history: list[Sample], binary: bool):
+    await websocket.send(json.dumps({ 'type': 'history', 'count': len(history) }))
+
+    for start in range(0, len(history), historyMessageSize):
+        samples = history[start:start + historyMessageSize]
+        if binary:
+            await websocket.send(encode_batch(samples))
+        else:
+            for sample in samples:
+                await websocket.send(sample.json())
+
+    metrics.increment('sent', 'history_samples', len(history))
+
+
+async def send_loop(websocket: WebSocketServerProtocol, subscriber: Subscriber, history: list[Sample]):
+    binary = websocket.subprotocol == BINARY_SUBPROTOCOL
+
+    try:
+        if binary:
+            await websocket.send(schema_message())
+        await send_history(websocket, history, binary)
+
+        while True:
+            messages = await subscriber.get_batch(maxSamplesPerMessage)
+
+            samples = []
+            for message in messages:
+                if isinstance(message, Sample):
+                    samples.append(message)
                     continue
 
-                if latest_received_timestamp:
-                    time_since_first_receive = received_time - first_received_timestamp
-                    if time_since_first_receive < 0:
-                        # Abort if the data is older than the oldest.
-                        # This might mess up the first few values if they are
-                        # sent out of order, but that is an okay drawback.
-                        print('[ERROR] Received data is older than the oldest data.')
-                        continue
-
-                    time_since_latest_receive = received_time - latest_received_timestamp
-                    if time_since_latest_receive > 1000 * 60 * 10:
-                        # Abort the data is more than 10 minutes older than the
-                        # newest data.
-                        print('[ERROR] Received data is more than 10 minutes older than the newest data.')
-                        continue
-
-                update_received_time(received_time)
-
-                startTimeFromZero(data)
-                ignore_disabled_sensors_in_drop_data(data)
-                process_drop_data(data)
-
-                directory.saveDropData(data)
-
-                if (
-                        # Send if this is the first time sending.
-                        (not latest_sent_timestamp)
-                        # Send if enough time has passed since the last data was sent.
-                        or (received_time - latest_sent_timestamp >= websocketDelay)
-                    ):
-                    filtered_data = removeNoneFromDictionary(asdict(data))
-                    await websocket.send(json.dumps(filtered_data))
-                    update_send_time(received_time)
-                    
-            case ReceiveState.TEXT:
-                text = relay.try_receive_text()
-                if text:
-                    print(text)
-
-
-async def on_websocket_connect(websocket: WebSocketServerProtocol, serial: Serial):
-    global received_timestamps
+                # Status messages are text and keep their place in the stream.
+                await send_samples(websocket, samples, binary)
+                samples = []
+                await websocket.send(message)
+
+            await send_samples(websocket, samples, binary)
+    except ConnectionClosed:
+        pass
+
 
-    received_timestamps = []
+async def on_websocket_connect(websocket: WebSocketServerProtocol, hub: BroadcastHub):
+    subscriber, history = hub.subscribe_with_history()
+    subscriber.decimator = Decimator(defaultDecimationMode, defaultPointsPerSecond)
+    send_task = asyncio.create_task(send_loop(websocket, subscriber, history))
 
-    directory = Directory()
-    relay = Relay(serial)
+    try:
+        await websocket_loop(websocket, subscriber)
+    finally:
+        send_task.cancel()
+        hub.unsubscribe(subscriber)
+        # Kept in the metrics, since the hub forgets the client.
+        metrics.increment('dropped', 'subscribers', subscriber.dropped)
+        if subscriber.dropped:
+            print(f'[WARNING] {subscriber.dropped} messages were dropped for a slow client.')
+
+
+def collect_metrics(queues: list[QueueMetrics], hub: BroadcastHub) -> dict:
+    summary = metrics.summary()
+    dropped = { queue.name: queue.dropped for queue in queues }
+    # The clients that disconnected and the ones still connected.
+    dropped['subscribers'] = metrics.count('dropped', 'subscribers') + sum(subscriber['dropped'] for subscriber in hub.summary())
+    summary['counters']['dropped'] = dropped
+    summary['queues'] = { queue.name: queue.summary() for queue in queues }
+    summary['link'] = link_monitor.latest_report
+    summary['receivers'] = receiver_statistics.summary()
+    summary['reorder'] = reorder_buffer.summary()
+    summary['uplink'] = uplink.summary()
+    return summary
+
+
+# Answers plain HTTP requests for the metrics path, every other request
+# continues with the websocket handshake.
+async def serve_metrics(path: str, request_headers, queues: list[QueueMetrics], hub: BroadcastHub):
+    if path.split('?')[0] != metricsPath:
+        return None
+
+    body = json.dumps(collect_metrics(queues, hub), indent=4).encode()
+    return HTTPStatus.OK, [('Content-Type', 'application/json')], body
+
+
+def print_receiver_statistics():
+    for name, summary in receiver_statistics.summary().items():
+        print(f"{name}: {summary['first']} frames first, {summary['duplicates']} duplicates, {summary['contribution']:.1%} of the frames, {summary['loss']:.1%} missed.")
+
+
+# The stages of a session, wired together by create_station.
+@dataclass
+class Station:
+    receivers: list[Receiver]
+    directory: Directory
+    frames: StageQueue
+    persistence: Worker
+    hub: BroadcastHub
+    queues: list[QueueMetrics]
+
+
+# Sets up a session for the given serial ports, used by run_station and the
+# end to end benchmark. Commands are sent through the first receiver.
+def create_station(serials: dict[str, Serial], calibration: CalibrationFile, root: Path = Path('data')) -> Station:
+    global calibration_file
+    global receiver_statistics
+    global uplink
+
+    calibration_file = calibration
+    receivers = [Receiver(name, serial, serialQueueSize, metrics, requireChecksum) for name, serial in serials.items()]
+    receiver_statistics = ReceiverStatistics(list(serials))
+    if receiver_statistics.multiple and reorderHold <= 0:
+        print('[WARNING] reorderHold is 0, the frames of the receivers are passed on in the order they arrive instead of by CanSat time.')
+
+    directory = Directory(root, policy=directoryFlushPolicy, segments=directorySegmentPolicy)
+    frames = StageQueue('frames', frameQueueSize, OverflowPolicy.BLOCK)
+    persistence = Worker(
+        'persistence', persistenceQueueSize, persistenceOverflowPolicy,
+        # Flush rows that are waiting in memory even if no new data arrives.
+        idle=directory.flush_if_due,
+        idle_interval=directoryFlushPolicy.max_delay_seconds,
+        close=directory.close,
+        latency=metrics.histogram('persist')
+    )
+    history = History(historyDuration, historyPointsPerSecond)
+    hub = BroadcastHub(subscriberQueueSize, subscriberDropPolicy, history)
+    uplink = Uplink(
+        receivers[0].serial, metrics, partial(on_command_result, hub=hub),
+        uplinkTimeout, uplinkRetries, uplinkQueueSize
+    )
+    queues = [receiver.reader.metrics for receiver in receivers] + [frames.metrics, persistence.metrics] + uplink.queues
+
+    return Station(receivers, directory, frames, persistence, hub, queues)
+
+
+# One ingest task per receiver owns its serial port until the stages are
+# cancelled, then the frames still held or queued are saved.
+async def run_stages(station: Station):
+    for receiver in station.receivers:
+        receiver.reader.start()
+    station.persistence.start()
+    uplink.start()
+    try:
+        async with asyncio.TaskGroup() as task_group:
+            for receiver in station.receivers:
+                task_group.create_task(ingest_loop(receiver, station.frames))
+            task_group.create_task(process_loop(station.frames, station.directory, station.persistence, station.hub))
+            task_group.create_task(calibration_loop())
+            task_group.create_task(statistics_loop(station.hub, station.queues))
+            task_group.create_task(decimation_flush_loop(station.hub))
+            task_group.create_task(link_loop(station.hub))
+            task_group.create_task(uplink.run())
+    finally:
+        for receiver in station.receivers:
+            await receiver.reader.stop()
+        await uplink.stop()
+        # Save the frames still held for reordering.
+        for received, data in reorder_buffer.drain():
+            await deliver_frame(received, data, station.directory, station.persistence, station.hub)
+        await station.persistence.stop()
+
+
+# The merged data is shared with every connected client.
+async def run_station(serials: dict[str, Serial], calibration: CalibrationFile, metrics_file: Path = None):
+    station = create_station(serials, calibration)
+    try:
+        async with serve(
+            partial(on_websocket_connect, hub=station.hub), 'localhost', 8765,
+            subprotocols=SUBPROTOCOLS,
+            process_request=partial(serve_metrics, queues=station.queues, hub=station.hub)
+        ):
+            await run_stages(station)
+    finally:
+        if receiver_statistics.multiple:
+            print_receiver_statistics()
+
+        if metrics_file is not None:
+            metrics.dump(metrics_file, collect_metrics(station.queues, station.hub))
+            print(f'Metrics saved to {metrics_file}')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(prog=sys.argv[0])
+    parser.add_argument('com_ports', nargs='*', metavar='com_port', help='serial ports of the ground station Arduinos, frames received by several are merged')
+    parser.add_argument('--capture', action='store_true', help='save every received byte to a capture file')
+    parser.add_argument('--capture-directory', type=Path, default=Path('captures'), help='where capture files are saved')
+    parser.add_argument('--replay', type=Path, nargs='+', default=[], metavar='FILE', help='read from capture files instead of serial ports')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed relative to real time')
+    parser.add_argument('--fast', action='store_true', help='replay as fast as possible')
+    parser.add_argument('--metrics', type=Path, metavar='FILE', help='save the station metrics to this file when the session ends')
+    parser.add_argument('--calibration', type=Path, default=Path(__file__).parent / 'calibration.json', help='calibration coefficients, reloaded when changed')
+
+    arguments = parser.parse_args()
+    if not arguments.com_ports and not arguments.replay:
+        parser.error('a COM port or --replay is required')
+
+    return arguments
+
+
+def open_serials(arguments, stack: ExitStack) -> dict[str, Serial]:
+    baud_rate = 115200
+    speed = None if arguments.fast else arguments.speed
 
-    async with asyncio.TaskGroup() as task_group:
-        task_group.create_task(serial_loop(websocket, serial, relay, directory))
+    serials = {}
+    for port in arguments.com_ports:
+        serials[port] = stack.enter_context(Serial(port=port, baudrate=baud_rate, timeout=READ_TIMEOUT_SECONDS))
+    for path in arguments.replay:
+        serials[str(path)] = stack.enter_context(ReplaySerial(path, speed, timeout=READ_TIMEOUT_SECONDS))
 
-        await websocket_loop(websocket, serial)
+    if arguments.capture:
+        for index, (name, serial) in enumerate(serials.items()):
+            path = capture_path(arguments.capture_directory, f'_{index}' if len(serials) > 1 else '')
+            serials[name] = stack.enter_context(CaptureSerial(serial, path))
+            print(f'Capturing {name} to {path}')
+
+    return serials
 
 
 async def main():
-    baud_rate = 115200
-    com_port: int = None
+    arguments = parse_arguments()
 
     try:
-        com_port = sys.argv[1]
-    except IndexError:
-        print(f'Usage: {sys.argv[0]} [COM Port]', file=sys.stderr)
+        calibration = CalibrationFile(arguments.calibration)
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        print(f'Invalid calibration file: {error}')
         return
 
     try:
-        with Serial(port=com_port, baudrate=baud_rate, timeout=0) as serial:
-            async with serve(partial(on_websocket_connect, serial=serial), 'localhost', 8765):
-                await asyncio.Future()
+        with ExitStack() as stack:
+            serials = open_serials(arguments, stack)
+            await run_station(serials, calibration, arguments.metrics)
     except SerialException:
         print("Invalid COM Port")
         return
 
 
-try:
-    asyncio.run(main())
-except KeyboardInterrupt:
-    print('Bye')
-    os._exit(0)
+# The station can also be imported, for example by the end to end benchmark.
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print('Bye')
+        os._exit(0)
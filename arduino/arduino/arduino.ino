@@ -4,6 +4,10 @@
 #define RADIO_CE_PIN 9
 #define RADIO_CSN_PIN 10
 
+// Send DATA and DROP frames with a CRC-16 after the payload. The ground
+// station accepts frames with and without it.
+#define SEND_CHECKSUM true
+
 const uint8_t ground_station_address[6] = { "GRND4" };
 const uint8_t can_sat_address[6] = { "CANS4" };
 
@@ -37,10 +41,19 @@ struct Command {
   byte value;
 };
 
+struct Acknowledgement {
+  byte action;
+  byte value;
+  byte delivered;
+};
+
 enum HeaderByte : char {
   data_header_byte = '0',
   drop_header_byte,
-  text_header_byte
+  text_header_byte,
+  checked_data_header_byte,
+  checked_drop_header_byte,
+  ack_header_byte
 };
 
 enum CommandTypes {
@@ -81,24 +94,40 @@ void sendHeader(const char type) {
   Serial.print(type);
 }
 
-void sendData(const Data &data) {
-  sendHeader(data_header_byte);
-
-  const auto byteInterpretation = reinterpret_cast<const char *>(&data);
-
-  for (int i = 0; i < sizeof(data); ++i) {
-    Serial.print(byteInterpretation[i]);
+// CRC-16/CCITT-FALSE, which is binascii.crc_hqx with 0xFFFF as the start
+// value on the ground station.
+uint16_t updateChecksum(uint16_t checksum, const byte value) {
+  checksum ^= (uint16_t)value << 8;
+  for (int bit = 0; bit < 8; ++bit) {
+    checksum = (checksum & 0x8000) ? (checksum << 1) ^ 0x1021 : checksum << 1;
   }
+  return checksum;
 }
 
-void sendDropData(const DropData &data) {
-  sendHeader(drop_header_byte);
+void sendFrame(const char type, const void *payload, const size_t size, const bool checked) {
+  sendHeader(type);
 
-  const auto byteInterpretation = reinterpret_cast<const char *>(&data);
+  const auto byteInterpretation = reinterpret_cast<const char *>(payload);
+  uint16_t checksum = updateChecksum(0xFFFF, type);
 
-  for (int i = 0; i < sizeof(data); ++i) {
+  for (int i = 0; i < size; ++i) {
     Serial.print(byteInterpretation[i]);
+    checksum = updateChecksum(checksum, byteInterpretation[i]);
   }
+
+  // The checksum covers the type byte and the payload.
+  if (checked) {
+    Serial.write(checksum & 0xFF);
+    Serial.write(checksum >> 8);
+  }
+}
+
+void sendData(const Data &data) {
+  sendFrame(SEND_CHECKSUM ? checked_data_header_byte : data_header_byte, &data, sizeof(data), SEND_CHECKSUM);
+}
+
+void sendDropData(const DropData &data) {
+  sendFrame(SEND_CHECKSUM ? checked_drop_header_byte : drop_header_byte, &data, sizeof(data), SEND_CHECKSUM);
 }
 
 void sendText(const char *text) {
@@ -106,6 +135,14 @@ void sendText(const char *text) {
   Serial.println(text);
 }
 
+// Tells the ground station whether the CanSat acknowledged the command, so it
+// can retry and keep track of the sensor states. Always checked, so noise
+// cannot pass for an acknowledgement.
+void sendAcknowledgement(const Command &command, const bool delivered) {
+  const Acknowledgement acknowledgement = { command.action, command.value, delivered ? 1 : 0 };
+  sendFrame(ack_header_byte, &acknowledgement, sizeof(acknowledgement), true);
+}
+
 void transmitCommand(Command command) {
   radio.txStandBy();
   radio.stopListening();
@@ -125,6 +162,7 @@ void transmitCommand(Command command) {
   } while (!wasTransmitted && duration < 100);
 
   radio.startListening();
+  sendAcknowledgement(command, wasTransmitted);
 }
 
 void setup() {
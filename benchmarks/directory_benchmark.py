@@ -0,0 +1,106 @@
+import csv
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+from src.data import Vector, Data
+from src.directory import Directory
+
+# Run from the repository root with:
+#   python -m benchmarks.directory_benchmark [sample count]
+
+_DEFAULT_SAMPLE_COUNT = 20000
+_ROWS_PER_SAMPLE = 9
+
+
+def create_samples(count: int) -> list[Data]:
+    random.seed(0)
+    return [
+        Data(
+            acceleration=Vector(random.uniform(-20, 20), random.uniform(-20, 20), random.uniform(-20, 20)),
+            gyroscope=Vector(random.uniform(-250, 250), random.uniform(-250, 250), random.uniform(-250, 250)),
+            time=i * 10,
+            temperature_outside=random.uniform(0, 30),
+            distance=random.randint(0, 300),
+            air_quality=random.randint(0, 1023),
+            sound=random.randint(0, 1023),
+            temperature_inside=random.randint(0, 40),
+            humidity_inside=random.randint(0, 100),
+            humidity_outside=random.randint(0, 100)
+        )
+        for i in range(count)
+    ]
+
+
+# The per-row open/append behaviour that Directory used before the buffered
+# writer, kept here as the baseline.
+class LegacyDirectory:
+    def __init__(self, directory: Path):
+        self._directory = directory
+        self._directory.mkdir()
+        for name in ['acceleration', 'gyroscope']:
+            self._initialize(name, ['time', 'x', 'y', 'z'])
+        for name in self._number_names():
+            self._initialize(name, ['time', 'data'])
+
+
+    @staticmethod
+    def _number_names():
+        return [
+            'temperature_outside', 'distance', 'air_quality', 'sound',
+            'temperature_inside', 'humidity_inside', 'humidity_outside'
+        ]
+
+
+    def _initialize(self, name: str, fieldnames: list[str]):
+        with (self._directory / f'{name}.csv').open('w', newline='') as file:
+            csv.DictWriter(file, fieldnames=fieldnames).writeheader()
+
+
+    def saveData(self, data: Data):
+        for name in ['acceleration', 'gyroscope']:
+            vector = getattr(data, name)
+            with (self._directory / f'{name}.csv').open('a', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=['time', 'x', 'y', 'z'])
+                writer.writerow({ 'time': data.time, 'x': vector.x, 'y': vector.y, 'z': vector.z })
+        for name in self._number_names():
+            with (self._directory / f'{name}.csv').open('a', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=['time', 'data'])
+                writer.writerow({ 'time': data.time, 'data': getattr(data, name) })
+
+
+    def close(self):
+        pass
+
+
+def run(name: str, directory, samples: list[Data]):
+    start = time.perf_counter()
+    for data in samples:
+        directory.saveData(data)
+    directory.close()
+    duration = time.perf_counter() - start
+
+    rows = len(samples) * _ROWS_PER_SAMPLE
+    print(f'{name:>10}: {rows / duration:12.0f} rows/s ({duration:.3f} s)')
+    return duration
+
+
+def main():
+    try:
+        count = int(sys.argv[1])
+    except IndexError:
+        count = _DEFAULT_SAMPLE_COUNT
+
+    samples = create_samples(count)
+
+    with tempfile.TemporaryDirectory() as root:
+        legacy = run('legacy', LegacyDirectory(Path(root, 'legacy')), samples)
+        buffered = run('buffered', Directory(root=Path(root)), samples)
+
+    print(f'Speedup: {legacy / buffered:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+import asyncio
+from contextlib import redirect_stdout
+import importlib.util
+import os
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import time
+
+from websockets.client import connect
+from websockets.server import serve
+
+from src.broadcast import Subscriber
+from src.calibration import CalibrationFile
+from src.capture import ReplaySerial, write_capture
+from src.data import Data, DropData
+from src.decimation import Decimator
+from src.generator import TelemetryGenerator
+from src.metrics import Histogram
+from src.relay import Relay
+from src.serial_reader import READ_TIMEOUT_SECONDS
+from src.wire import Sample, encode_batch
+
+# Drives every stage of the station with generated telemetry as fast as it
+# can and reports frames per second, latency percentiles and memory growth.
+# The station stage replays the telemetry through a station set up by the
+# station's own create_station and run_stages, from the serial reader thread
+# through validation, reordering, calibration, anomaly detection and
+# decimation for every client to persistence on the worker thread, and counts
+# the frames it accepted. The latencies are per chunk for the relay, per frame
+# for processing and persistence, and from send to receive per message for
+# the websocket.
+# Run from the repository root with:
+#   python -m benchmarks.end_to_end_benchmark [seconds of telemetry] [corruption]
+
+_DATA_RATE = 100
+_DROP_RATE = 300
+_TEXT_RATE = 1
+# Bytes handed to the relay at a time, about what a serial read returns.
+_CHUNK_SIZE = 256
+_SAMPLES_PER_MESSAGE = 32
+_CLIENTS = 2
+_PORT = 8766
+_RECEIVER = 'benchmark'
+_ROOT = Path(__file__).parents[1]
+
+
+def memory() -> int:
+    # Resident set size in bytes, Linux only.
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * 4096
+
+
+def percentiles(latencies: list[float]) -> tuple[float, float]:
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return quantiles[49], quantiles[98]
+
+
+# The station's histograms only know the bucket a latency fell in, so these
+# are upper bounds.
+def histogram_percentiles(histogram: Histogram) -> tuple[float, float]:
+    return histogram.percentile(0.5) or 0, histogram.percentile(0.99) or 0
+
+
+def report(name: str, frames: int, duration: float, latencies: tuple[float, float], memory_before: int):
+    p50, p99 = latencies
+    growth = (memory() - memory_before) / 1e6
+    print(
+        f'{name:>10}: {frames / duration:10.0f} frames/s, '
+        f'p50 {p50 * 1e6:8.1f} µs, p99 {p99 * 1e6:8.1f} µs, '
+        f'memory {growth:+7.1f} MB'
+    )
+
+
+def generate(seconds: float, corruption: float) -> list[tuple[int, bytes]]:
+    generator = TelemetryGenerator(_DATA_RATE, _DROP_RATE, _TEXT_RATE, corruption=corruption)
+    return list(generator.frames(int(seconds * 1000)))
+
+
+def run_relay(stream: bytes) -> list[Data | DropData | str]:
+    memory_before = memory()
+    relay = Relay()
+    messages = []
+    latencies = []
+
+    # The relay prints every corrupted frame, which is not what is measured.
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        for offset in range(0, len(stream), _CHUNK_SIZE):
+            chunk_start = time.perf_counter()
+            relay.feed(stream[offset:offset + _CHUNK_SIZE])
+            messages += relay.receive()
+            latencies.append(time.perf_counter() - chunk_start)
+        duration = time.perf_counter() - start
+
+    report('relay', len(messages), duration, percentiles(latencies), memory_before)
+    return messages
+
+
+def load_station():
+    spec = importlib.util.spec_from_file_location('station', _ROOT / '__main__.py')
+    station = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(station)
+    return station
+
+
+# Takes what the station publishes to a client, the way send_loop does.
+async def consume(subscriber: Subscriber, received: list):
+    while True:
+        received += await subscriber.get_batch(_SAMPLES_PER_MESSAGE)
+
+
+# Replays the telemetry as fast as the station reads it and waits until every
+# message is processed and every accepted frame is written. Returns the
+# samples published to the clients.
+async def run_station(frames: list[tuple[int, bytes]], message_count: int) -> list[Sample]:
+    station = load_station()
+
+    with tempfile.TemporaryDirectory() as root:
+        capture = Path(root, 'telemetry.cap')
+        write_capture(capture, ((timestamp / 1000, frame) for timestamp, frame in frames))
+
+        memory_before = memory()
+        # Validation errors and strange data are printed for every frame.
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            serial = ReplaySerial(capture, None, timeout=READ_TIMEOUT_SECONDS)
+            stages = station.create_station({ _RECEIVER: serial }, CalibrationFile(_ROOT / 'calibration.json'), Path(root))
+
+            published = []
+            consumers = []
+            for index in range(_CLIENTS + 1):
+                subscriber = stages.hub.subscribe()
+                # The last one collects every sample for the websocket stage.
+                if index < _CLIENTS:
+                    subscriber.decimator = Decimator(station.defaultDecimationMode, station.defaultPointsPerSecond)
+                consumers.append(asyncio.create_task(consume(subscriber, published if index == _CLIENTS else [])))
+
+            start = time.perf_counter()
+            task = asyncio.create_task(station.run_stages(stages))
+            processed = station.metrics.histogram('process')
+            # The last frames are released once the reorder hold has passed.
+            while processed.count < message_count or not stages.frames.empty() or len(station.reorder_buffer):
+                await asyncio.sleep(0.001)
+            # Let process_loop finish handing the last frames to persistence.
+            await asyncio.sleep(station.reorderHold)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            duration = time.perf_counter() - start
+
+            for consumer in consumers:
+                consumer.cancel()
+
+    # Every line is the throughput of the whole station, with the latencies
+    # of validation, of saving and publishing, and of the file writes.
+    accepted = station.receiver_statistics.summary()[_RECEIVER]['first']
+    for stage in ('process', 'deliver', 'persist'):
+        report(stage, accepted, duration, histogram_percentiles(station.metrics.histogram(stage)), memory_before)
+    print(f"{'':>10}  {accepted} frames accepted, {station.metrics.count('rejected')} rejected of {message_count} messages")
+    if any(subscriber['dropped'] for subscriber in stages.hub.summary()):
+        print('[WARNING] Samples were dropped for the benchmark clients.')
+
+    return [message for message in published if isinstance(message, Sample)]
+
+
+# Sends every sample in binary batches to local clients, the way send_loop
+# does without decimation. The latency is from the send to the client
+# receiving the message.
+async def run_websocket(samples: list[Sample]):
+    memory_before = memory()
+    messages = [
+        encode_batch(samples[offset:offset + _SAMPLES_PER_MESSAGE])
+        for offset in range(0, len(samples), _SAMPLES_PER_MESSAGE)
+    ]
+    # The send times of every connection, by the port of the client.
+    send_times: dict[int, list[float]] = {}
+    latencies = []
+
+    async def send(websocket):
+        times = send_times[websocket.remote_address[1]] = []
+        for message in messages:
+            times.append(time.perf_counter())
+            await websocket.send(message)
+        await websocket.close()
+
+    async def receive():
+        async with connect(f'ws://localhost:{_PORT}', max_size=None) as websocket:
+            port = websocket.local_address[1]
+            index = 0
+            async for _ in websocket:
+                latencies.append(time.perf_counter() - send_times[port][index])
+                index += 1
+
+    async with serve(send, 'localhost', _PORT, max_size=None):
+        start = time.perf_counter()
+        await asyncio.gather(*(receive() for _ in range(_CLIENTS)))
+        duration = time.perf_counter() - start
+
+    report('websocket', len(samples) * _CLIENTS, duration, percentiles(latencies), memory_before)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    corruption = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    frames = generate(seconds, corruption)
+    stream = b''.join(frame for _, frame in frames)
+    print(f'{len(stream) / 1e6:.1f} MB of telemetry, {seconds:.0f} s at {_DATA_RATE} DATA and {_DROP_RATE} DROP frames/s')
+
+    messages = run_relay(stream)
+    samples = asyncio.run(run_station(frames, len(messages)))
+    asyncio.run(run_websocket(samples))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+from pathlib import Path
+import sys
+import time
+
+from src.capture import ReplaySerial
+from src.calibration import Calibration
+from src.data import Data, DropData
+from src.relay import Relay
+
+# Decodes a capture file through Relay as fast as possible, one frame at a time
+# and in batches. Run from the repository root with:
+#   python -m benchmarks.replay_benchmark [capture file]
+
+
+def replay(path: Path) -> dict[str, int]:
+    serial = ReplaySerial(path, speed=None)
+    relay = Relay()
+    counts = { 'data': 0, 'drop': 0, 'text': 0 }
+
+    while not serial.finished:
+        relay.feed(serial.read(serial.in_waiting))
+        for message in relay.receive():
+            match message:
+                case Data():
+                    counts['data'] += 1
+                case DropData():
+                    counts['drop'] += 1
+                case str():
+                    counts['text'] += 1
+
+    return counts
+
+
+def replay_batch(path: Path) -> dict[str, int]:
+    calibration = Calibration.from_file(Path(__file__).parents[1] / 'calibration.json')
+    serial = ReplaySerial(path, speed=None)
+    relay = Relay()
+    counts = { 'data': 0, 'drop': 0, 'text': 0 }
+
+    while not serial.finished:
+        relay.feed(serial.read(serial.in_waiting))
+        data, drop_data, texts = relay.receive_batch()
+        calibration.apply_batch(data)
+        calibration.apply_drop_batch(drop_data)
+        counts['data'] += len(data)
+        counts['drop'] += len(drop_data)
+        counts['text'] += len(texts)
+
+    return counts
+
+
+def run(name: str, replay_function, path: Path):
+    size = path.stat().st_size
+
+    start = time.perf_counter()
+    counts = replay_function(path)
+    duration = time.perf_counter() - start
+
+    frames = sum(counts.values())
+    print(f'{name:>7}: {frames / duration:10.0f} frames/s, {size / duration / 1e6:6.2f} MB/s ({duration:.3f} s) {counts}')
+
+
+def main():
+    try:
+        path = Path(sys.argv[1])
+    except IndexError:
+        print(f'Usage: {sys.argv[0]} [capture file]', file=sys.stderr)
+        return
+
+    run('single', replay, path)
+    run('batch', replay_batch, path)
+
+
+if __name__ == '__main__':
+    main()
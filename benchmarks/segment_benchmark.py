@@ -0,0 +1,88 @@
+from contextlib import redirect_stdout
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from src.analysis import load_session
+from src.data import Data, DropData
+from src.directory import Directory
+from src.generator import TelemetryGenerator
+from src.relay import Relay
+from src.segments import SegmentPolicy
+from src.writer import FlushPolicy
+
+# Writes generated telemetry through Directory as single CSV files and as
+# rotated segments with different gzip levels, and reports the write
+# throughput, the size on disk, the compression ratio and how long it takes
+# to load the session back.
+# Run from the repository root with:
+#   python -m benchmarks.segment_benchmark [seconds of telemetry]
+
+_DATA_RATE = 100
+_DROP_RATE = 300
+# Small segments so that even a short run rotates and compresses many times.
+_SEGMENT_ROWS = 20000
+
+
+def generate(seconds: float) -> list[Data | DropData]:
+    generator = TelemetryGenerator(_DATA_RATE, _DROP_RATE, noise=0.01)
+    relay = Relay()
+    relay.feed(b''.join(frame for _, frame in generator.frames(int(seconds * 1000))))
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return [message for message in relay.receive() if not isinstance(message, str)]
+
+
+# The size of the CSV files and segments, without the flight logs.
+def csv_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.iterdir() if '.csv' in file.name)
+
+
+def run(name: str, root: Path, messages: list[Data | DropData], segments: SegmentPolicy = None) -> int:
+    root.mkdir()
+    directory = Directory(root, FlushPolicy(), flight_log=False, segments=segments)
+    rows = 0
+
+    start = time.perf_counter()
+    for message in messages:
+        if type(message) is Data:
+            directory.saveData(message)
+            rows += 9
+        else:
+            directory.saveDropData(message)
+            rows += 2
+    write_duration = time.perf_counter() - start
+    # Closing waits for the last segments to be compressed.
+    directory.close()
+    close_duration = time.perf_counter() - start - write_duration
+
+    size = csv_size(directory.path)
+
+    start = time.perf_counter()
+    load_session(directory.path)
+    load_duration = time.perf_counter() - start
+
+    print(
+        f'{name:>12}: {rows / write_duration:10.0f} rows/s, close {close_duration:6.3f} s, '
+        f'{size / 1e6:7.2f} MB, load {load_duration:6.3f} s'
+    )
+    return size
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+
+    messages = generate(seconds)
+    print(f'{len(messages)} frames, {seconds:.0f} s at {_DATA_RATE} DATA and {_DROP_RATE} DROP frames/s')
+
+    with tempfile.TemporaryDirectory() as root:
+        plain = run('single file', Path(root, 'plain'), messages)
+        run('segments', Path(root, 'segments'), messages, SegmentPolicy(_SEGMENT_ROWS, compression_level=0))
+        for level in (1, 6, 9):
+            size = run(f'gzip {level}', Path(root, f'gzip_{level}'), messages, SegmentPolicy(_SEGMENT_ROWS, compression_level=level))
+            print(f'{"":>12}  compression ratio {plain / size:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+from src.analysis import load_session
+from src.data import Vector, Data, DropData
+from src.directory import Directory
+from src.session_index import SessionIndex
+
+# Compares reading a three second window of every channel by loading the CSVs
+# with reading it through the time index of the flight logs.
+# Run from the repository root with:
+#   python -m benchmarks.session_index_benchmark [minutes]
+
+_PACKET_INTERVAL = 10
+_WINDOW = 3000
+_QUERIES = 200
+
+
+def record_session(root: Path, duration: int) -> Path:
+    directory = Directory(root)
+    for timestamp in range(0, duration, _PACKET_INTERVAL):
+        acceleration = Vector(0.1, 0.2, 9.8)
+        gyroscope = Vector(1.0, 2.0, 3.0)
+        directory.saveData(Data(acceleration, gyroscope, timestamp, 20.5, 150, 300, 400, 21, 40, 45))
+        directory.saveDropData(DropData(acceleration, gyroscope, timestamp + _PACKET_INTERVAL // 2))
+    directory.close()
+    return directory.path
+
+
+def main():
+    try:
+        minutes = float(sys.argv[1])
+    except IndexError:
+        minutes = 10
+
+    duration = int(minutes * 60 * 1000)
+    random.seed(0)
+    starts = [random.randrange(0, duration - _WINDOW) for _ in range(_QUERIES)]
+
+    with tempfile.TemporaryDirectory() as root:
+        path = record_session(Path(root), duration)
+
+        start_time = time.perf_counter()
+        for start in starts[:5]:
+            load_session(path).window(start, start + _WINDOW)
+        per_query = (time.perf_counter() - start_time) / 5
+        print(f'    csv: {per_query * 1e3:10.3f} ms/window')
+
+        start_time = time.perf_counter()
+        index = SessionIndex(path)
+        print(f'  build: {(time.perf_counter() - start_time) * 1e3:10.3f} ms for {len(index)} samples')
+
+        start_time = time.perf_counter()
+        for start in starts:
+            index.window(start, start + _WINDOW)
+        per_query = (time.perf_counter() - start_time) / len(starts)
+        print(f'  index: {per_query * 1e3:10.3f} ms/window')
+
+
+if __name__ == '__main__':
+    main()
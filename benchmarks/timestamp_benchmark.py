@@ -0,0 +1,67 @@
+import random
+import sys
+import time
+
+from src.timestamps import TimestampWindow
+
+# Measures the cost of checking and recording a timestamp as a session grows.
+# Run from the repository root with:
+#   python -m benchmarks.timestamp_benchmark [hours]
+
+_PACKET_INTERVAL = 10
+_DUPLICATE_WINDOW = 1000 * 60
+_MEASURED_PACKETS = 10000
+# The list is O(n) per packet, so it is only followed for a few minutes.
+_LIST_LIMIT = 1000 * 60 * 5
+
+
+def timestamps(duration: int):
+    random.seed(0)
+    for timestamp in range(0, duration, _PACKET_INTERVAL):
+        # Deliver some packets slightly out of order.
+        yield timestamp + random.choice([0, 0, 0, -3 * _PACKET_INTERVAL])
+
+
+def measure(name: str, contains, add, size, duration: int, checkpoints: list[int]):
+    checkpoint_index = 0
+    measured = 0
+    measure_start: float = None
+
+    for timestamp in timestamps(duration):
+        if checkpoint_index < len(checkpoints) and timestamp >= checkpoints[checkpoint_index]:
+            if measure_start is None:
+                measure_start = time.perf_counter()
+
+        if not contains(timestamp):
+            add(timestamp)
+
+        if measure_start is not None:
+            measured += 1
+            if measured == _MEASURED_PACKETS:
+                per_packet = (time.perf_counter() - measure_start) / measured
+                minutes = checkpoints[checkpoint_index] / 1000 / 60
+                print(f'{name:>7} after {minutes:6.1f} min: {per_packet * 1e9:10.0f} ns/packet, {size():8} timestamps kept')
+                checkpoint_index += 1
+                measured = 0
+                measure_start = None
+
+
+def main():
+    try:
+        hours = float(sys.argv[1])
+    except IndexError:
+        hours = 3
+
+    duration = int(hours * 1000 * 60 * 60)
+    checkpoints = [int(duration * fraction) for fraction in [0.01, 0.25, 0.5, 0.75, 0.95]]
+
+    received_list = []
+    list_checkpoints = [int(_LIST_LIMIT * fraction) for fraction in [0.01, 0.25, 0.5]]
+    measure('list', received_list.__contains__, received_list.append, received_list.__len__, _LIST_LIMIT, list_checkpoints)
+
+    window = TimestampWindow(_DUPLICATE_WINDOW)
+    measure('window', window.__contains__, window.add, window.__len__, duration, checkpoints)
+
+
+if __name__ == '__main__':
+    main()
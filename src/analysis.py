@@ -0,0 +1,207 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+import warnings
+
+import numpy as np
+
+from .directory import NUMBER_CHANNELS, VECTOR_CHANNELS
+from .flight_log import DATA_LOG_NAME
+from .segments import has_channel, read_channel_lines
+from .session_index import SessionIndex
+
+# Below this acceleration magnitude, in m/s^2, the CanSat counts as falling.
+FREE_FALL_ACCELERATION = 3.0
+# How long the acceleration must stay low for a drop to be detected, in ms.
+MIN_DROP_DURATION = 100
+# The acceleration magnitude of the landing, in m/s^2.
+LANDING_ACCELERATION = 2 * 9.82
+# Length of the bins of the temperature and humidity profiles, in ms.
+PROFILE_BIN_DURATION = 1000
+
+_PROFILE_CHANNELS = ['temperature_outside', 'temperature_inside', 'humidity_outside', 'humidity_inside']
+
+
+# The channels of a recorded session aligned on one time axis. Every channel
+# has a row for each time, with NaN where the channel has no value.
+@dataclass(slots=True)
+class Session:
+    path: Path
+    time: np.ndarray
+    channels: dict[str, np.ndarray]
+
+
+    def window(self, start: int, end: int) -> dict[str, np.ndarray]:
+        first, last = np.searchsorted(self.time, [start, end])
+        window = { name: values[first:last] for name, values in self.channels.items() }
+        window['time'] = self.time[first:last]
+        return window
+
+
+# Reads every segment of a channel, see read_channel_lines.
+def _read_channel(path: Path, channel: str, columns: int) -> np.ndarray:
+    with warnings.catch_warnings():
+        # An empty channel only has headers.
+        warnings.simplefilter('ignore', UserWarning)
+        return np.loadtxt(read_channel_lines(path, channel), delimiter=',', ndmin=2).reshape(-1, columns)
+
+
+def load_session(path: Path) -> Session:
+    path = Path(path)
+    rows = {}
+    for channel in VECTOR_CHANNELS:
+        rows[channel] = _read_channel(path, channel, 4)
+    for channel in NUMBER_CHANNELS:
+        rows[channel] = _read_channel(path, channel, 2)
+
+    time = np.unique(np.concatenate([channel_rows[:, 0] for channel_rows in rows.values()])).astype(np.int64)
+
+    channels = {}
+    for channel, channel_rows in rows.items():
+        values = np.full((len(time), channel_rows.shape[1] - 1), np.nan)
+        values[np.searchsorted(time, channel_rows[:, 0])] = channel_rows[:, 1:]
+        channels[channel] = values if channel in VECTOR_CHANNELS else values[:, 0]
+
+    return Session(path, time, channels)
+
+
+# The samples of every channel with start <= time < end. Sessions with a
+# flight log are read through its time index, older sessions from the CSVs.
+def session_window(path: Path, start: int, end: int) -> dict[str, np.ndarray]:
+    path = Path(path)
+    if not (path / DATA_LOG_NAME).exists():
+        return load_session(path).window(start, end)
+
+    records = SessionIndex(path).window(start, end)
+    window = { 'time': records['time'] }
+    for channel in VECTOR_CHANNELS:
+        window[channel] = np.stack([records[f'{channel}_{axis}'] for axis in 'xyz'], axis=1)
+    for channel in NUMBER_CHANNELS:
+        window[channel] = records[channel]
+    return window
+
+
+# Finds the first time the acceleration stays below FREE_FALL_ACCELERATION
+# for MIN_DROP_DURATION, and the first landing impact after it.
+def detect_drop(session: Session) -> dict | None:
+    acceleration = session.channels['acceleration']
+    present = ~np.isnan(acceleration).any(axis=1)
+    time = session.time[present]
+    magnitude = np.linalg.norm(acceleration[present], axis=1)
+    if len(time) == 0:
+        return None
+
+    falling = magnitude < FREE_FALL_ACCELERATION
+    # Start and end indices of every run of falling samples.
+    edges = np.diff(np.concatenate(([0], falling.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    long_enough = time[ends] - time[starts] >= MIN_DROP_DURATION
+    if not long_enough.any():
+        return None
+
+    start = starts[long_enough][0]
+    end = ends[long_enough][0]
+    impacts = np.flatnonzero(magnitude[end:] > LANDING_ACCELERATION)
+    landing = end + impacts[0] if len(impacts) else None
+
+    return {
+        'start': int(time[start]),
+        'free_fall_end': int(time[end]),
+        'landing': None if landing is None else int(time[landing]),
+        'duration': None if landing is None else int(time[landing] - time[start]),
+        'peak_acceleration': None if landing is None else float(magnitude[landing:].max())
+    }
+
+
+# The descent rate in m/s from the ultrasonic distance to the ground, which is
+# in cm.
+def descent_rate(session: Session, start: int = None, end: int = None) -> dict | None:
+    distance = session.channels['distance']
+    present = ~np.isnan(distance)
+    if start is not None:
+        present &= session.time >= start
+    if end is not None:
+        present &= session.time <= end
+
+    time = session.time[present] / 1000
+    distance = distance[present] / 100
+    if len(time) < 2:
+        return None
+
+    rates = -np.diff(distance) / np.diff(time)
+    slope = np.polyfit(time, distance, 1)[0]
+    return {
+        'mean': float(-slope),
+        'median': float(np.median(rates)),
+        'maximum': float(rates.max())
+    }
+
+
+# The mean of each channel in bins of PROFILE_BIN_DURATION.
+def profiles(session: Session) -> dict[str, list]:
+    if len(session.time) == 0:
+        return {}
+
+    bins = (session.time - session.time[0]) // PROFILE_BIN_DURATION
+    count = int(bins[-1]) + 1
+
+    result = { 'time': (session.time[0] + np.arange(count) * PROFILE_BIN_DURATION).tolist() }
+    for channel in _PROFILE_CHANNELS:
+        values = session.channels[channel]
+        present = ~np.isnan(values)
+        sums = np.bincount(bins[present], weights=values[present], minlength=count)
+        counts = np.bincount(bins[present], minlength=count)
+        with np.errstate(invalid='ignore'):
+            means = sums / counts
+        result[channel] = [None if np.isnan(mean) else float(mean) for mean in means]
+
+    return result
+
+
+def summarize(values: np.ndarray) -> dict | None:
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    return {
+        'minimum': float(values.min()),
+        'maximum': float(values.max()),
+        'mean': float(values.mean())
+    }
+
+
+def analyze_session(session: Session, include_profiles: bool = False) -> dict:
+    drop = detect_drop(session)
+    report = {
+        'session': str(session.path),
+        'samples': len(session.time),
+        'duration': int(session.time[-1] - session.time[0]) if len(session.time) else 0,
+        'drop': drop,
+        'descent_rate': descent_rate(session, drop['start'], drop['landing']) if drop else descent_rate(session),
+        'channels': { channel: summarize(session.channels[channel]) for channel in NUMBER_CHANNELS }
+    }
+    if include_profiles:
+        report['profiles'] = profiles(session)
+    return report
+
+
+def _load_and_analyze(path: Path, include_profiles: bool) -> dict:
+    return analyze_session(load_session(path), include_profiles)
+
+
+# Analyzes every session on its own process. Only the reports are sent back,
+# the sessions themselves stay in the worker processes.
+def analyze_sessions(paths: list[Path], include_profiles: bool = False, workers: int = None) -> list[dict]:
+    if len(paths) <= 1 or workers == 1:
+        return [_load_and_analyze(path, include_profiles) for path in paths]
+
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(_load_and_analyze, paths, [include_profiles] * len(paths)))
+
+
+# Session directories are named after their start time, see Directory.
+def find_sessions(root: Path) -> list[Path]:
+    root = Path(root)
+    if has_channel(root, 'acceleration'):
+        return [root]
+    return sorted(path for path in root.iterdir() if has_channel(path, 'acceleration'))
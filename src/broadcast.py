@@ -0,0 +1,127 @@
+import asyncio
+from enum import Enum, auto
+import time
+
+
+class DropPolicy(Enum):
+    # Throw away the oldest queued message to make room for the new one.
+    OLDEST = auto()
+    # Throw away the new message and keep the queue as it is.
+    NEWEST = auto()
+
+
+class Subscriber:
+    def __init__(self, max_queue_size: int, drop_policy: DropPolicy):
+        self._queue: asyncio.Queue = asyncio.Queue(max_queue_size)
+        self._drop_policy = drop_policy
+        self.dropped = 0
+        # Optional object with add(message) and flush() methods that return
+        # the messages to pass on, used to reduce the rate for this subscriber.
+        self.decimator = None
+
+
+    def publish(self, message):
+        if self.decimator is None:
+            self.put(message)
+        else:
+            for decimated in self.decimator.add(message):
+                self.put(decimated)
+
+
+    # Passes on the messages the decimator still holds back.
+    def flush(self):
+        if self.decimator is not None:
+            for decimated in self.decimator.flush():
+                self.put(decimated)
+
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+
+    async def get(self):
+        return await self._queue.get()
+
+
+    # Waits for a message and returns it together with the messages that are
+    # already queued behind it.
+    async def get_batch(self, max_count: int) -> list:
+        batch = [await self._queue.get()]
+        while len(batch) < max_count and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+
+    def put(self, message):
+        if self._queue.full():
+            self.dropped += 1
+            if self._drop_policy == DropPolicy.NEWEST:
+                return
+            self._queue.get_nowait()
+
+        self._queue.put_nowait(message)
+
+
+# Fans every published message out to all subscribers. Each subscriber has its
+# own bounded queue, so a slow client only loses its own messages and never
+# holds up the publisher. Published messages are also added to the optional
+# history, an object with add(message) and snapshot() methods.
+class BroadcastHub:
+    def __init__(self, max_queue_size: int = 64, drop_policy: DropPolicy = DropPolicy.OLDEST, history=None):
+        self._max_queue_size = max_queue_size
+        self._drop_policy = drop_policy
+        self._subscribers: set[Subscriber] = set()
+        self._history = history
+        # The perf_counter() time of the last published message.
+        self.last_published: float = None
+
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+    def summary(self) -> list[dict]:
+        return [
+            { 'depth': subscriber.depth, 'dropped': subscriber.dropped }
+            for subscriber in self._subscribers
+        ]
+
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self._max_queue_size, self._drop_policy)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+
+    # Subscribes and returns the history up to this point, including the
+    # samples the history has not decimated yet. Nothing is missed or repeated
+    # between the two, since both happen without yielding.
+    def subscribe_with_history(self) -> tuple[Subscriber, list]:
+        history = self._history.snapshot() if self._history is not None else []
+        return self.subscribe(), history
+
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+
+    def publish(self, message):
+        self.last_published = time.perf_counter()
+        if self._history is not None:
+            self._history.add(message)
+        for subscriber in self._subscribers:
+            subscriber.publish(message)
+
+
+    def flush(self):
+        for subscriber in self._subscribers:
+            subscriber.flush()
+
+
+    # Sends a message to every subscriber without decimation, for status
+    # updates that must not be thinned out.
+    def publish_status(self, message):
+        for subscriber in self._subscribers:
+            subscriber.put(message)
@@ -0,0 +1,126 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .data import Data, DropData
+
+_AXES = 'xyz'
+_NUMBER_CHANNELS = ['temperature_inside', 'humidity_inside', 'humidity_outside']
+
+
+# Every calibration step is affine, so the coefficients of each channel are
+# fused into a single scale and offset when the calibration is created:
+#   acceleration:  (k * a + m) * gravity  =  (k * gravity) * a + m * gravity
+#   gyroscope:     g - offset
+#   others:        k * v + m
+class Calibration:
+    def __init__(self, coefficients: dict):
+        gravity = coefficients['gravity']
+        acceleration = coefficients['acceleration']
+        gyroscope_offset = coefficients['gyroscope_offset']
+
+        self._acceleration_scale = tuple(acceleration[axis]['k'] * gravity for axis in _AXES)
+        self._acceleration_offset = tuple(acceleration[axis]['m'] * gravity for axis in _AXES)
+        self._gyroscope_offset = tuple(-gyroscope_offset[axis] for axis in _AXES)
+        self._numbers = {
+            channel: (coefficients[channel]['k'], coefficients[channel]['m'])
+            for channel in _NUMBER_CHANNELS
+        }
+
+        self._acceleration_scale_array = np.array(self._acceleration_scale)
+        self._acceleration_offset_array = np.array(self._acceleration_offset)
+        self._gyroscope_offset_array = np.array(self._gyroscope_offset)
+
+
+    @classmethod
+    def from_file(cls, path: Path):
+        with Path(path).open() as file:
+            return cls(json.load(file))
+
+
+    def apply(self, data: Data):
+        self.apply_drop(data)
+
+        scale, offset = self._numbers['temperature_inside']
+        if data.temperature_inside is not None:
+            data.temperature_inside = scale * data.temperature_inside + offset
+        scale, offset = self._numbers['humidity_inside']
+        if data.humidity_inside is not None:
+            data.humidity_inside = scale * data.humidity_inside + offset
+        scale, offset = self._numbers['humidity_outside']
+        if data.humidity_outside is not None:
+            data.humidity_outside = scale * data.humidity_outside + offset
+
+
+    def apply_drop(self, data: Data | DropData):
+        acceleration = data.acceleration
+        if acceleration is not None:
+            scale_x, scale_y, scale_z = self._acceleration_scale
+            offset_x, offset_y, offset_z = self._acceleration_offset
+            acceleration.x = scale_x * acceleration.x + offset_x
+            acceleration.y = scale_y * acceleration.y + offset_y
+            acceleration.z = scale_z * acceleration.z + offset_z
+
+        gyroscope = data.gyroscope
+        if gyroscope is not None:
+            offset_x, offset_y, offset_z = self._gyroscope_offset
+            gyroscope.x += offset_x
+            gyroscope.y += offset_y
+            gyroscope.z += offset_z
+
+
+    # The batch functions calibrate structured arrays from deserializeDataBatch
+    # and deserializeDropDataBatch in place. Missing values stay NaN.
+    def apply_batch(self, data: np.ndarray):
+        self.apply_drop_batch(data)
+
+        for channel, (scale, offset) in self._numbers.items():
+            column = data[channel]
+            column *= scale
+            column += offset
+
+
+    def apply_drop_batch(self, data: np.ndarray):
+        acceleration = data['acceleration']
+        acceleration *= self._acceleration_scale_array
+        acceleration += self._acceleration_offset_array
+
+        gyroscope = data['gyroscope']
+        gyroscope += self._gyroscope_offset_array
+
+
+# Keeps a calibration loaded from a file and reloads it when the file changes,
+# so the coefficients can be adjusted without restarting the station.
+class CalibrationFile:
+    def __init__(self, path: Path):
+        self._path = Path(path)
+        self._modified_time = os.stat(self._path).st_mtime_ns
+        self._calibration = Calibration.from_file(self._path)
+
+
+    @property
+    def calibration(self):
+        return self._calibration
+
+
+    def reload_if_changed(self) -> bool:
+        try:
+            modified_time = os.stat(self._path).st_mtime_ns
+        except OSError as error:
+            print(f'[ERROR] Could not check the calibration file: {error}')
+            return False
+
+        if modified_time == self._modified_time:
+            return False
+        self._modified_time = modified_time
+
+        try:
+            self._calibration = Calibration.from_file(self._path)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            # Keep the previous calibration until the file is fixed.
+            print(f'[ERROR] Could not reload the calibration from {self._path}: {error}')
+            return False
+
+        return True
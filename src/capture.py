@@ -0,0 +1,181 @@
+from datetime import datetime
+from pathlib import Path
+from struct import Struct
+import time
+
+from serial import Serial
+
+# A capture file is a sequence of chunks:
+#   seconds since capture start (f8) | byte count (u4) | bytes
+# Reads that happen close together are merged into one chunk so capturing a
+# byte-at-a-time reader does not blow up the file size.
+_CHUNK_HEADER = Struct('<dI')
+_COALESCE_SECONDS = 0.001
+
+CAPTURE_SUFFIX = '.cap'
+
+
+# The suffix tells apart the captures of receivers started at the same time.
+def capture_path(root: Path = Path('captures'), suffix: str = '') -> Path:
+    date_string = datetime.today().strftime("%Y-%m-%d_%H.%M.%S")
+    root.mkdir(parents=True, exist_ok=True)
+    return root / f'{date_string}{suffix}{CAPTURE_SUFFIX}'
+
+
+def read_capture(path: Path) -> list[tuple[float, bytes]]:
+    chunks = []
+    content = Path(path).read_bytes()
+    offset = 0
+    while offset + _CHUNK_HEADER.size <= len(content):
+        timestamp, length = _CHUNK_HEADER.unpack_from(content, offset)
+        offset += _CHUNK_HEADER.size
+        chunks.append((timestamp, content[offset:offset + length]))
+        offset += length
+    return chunks
+
+
+# Writes chunks of (seconds since the start, bytes) as a capture file, for
+# example generated traffic that ReplaySerial can then play back.
+def write_capture(path: Path, chunks):
+    with Path(path).open('xb') as file:
+        for timestamp, chunk in chunks:
+            file.write(_CHUNK_HEADER.pack(timestamp, len(chunk)))
+            file.write(chunk)
+
+
+class CaptureSerial:
+    def __init__(self, serial: Serial, path: Path):
+        self._serial = serial
+        self._file = Path(path).open('xb')
+        self._start_time = time.perf_counter()
+
+        self._chunk_time: float = None
+        self._chunk = bytearray()
+
+
+    @property
+    def in_waiting(self):
+        return self._serial.in_waiting
+
+
+    def read(self, size: int = 1) -> bytes:
+        received = self._serial.read(size)
+        if received:
+            self._record(received)
+        return received
+
+
+    def write(self, data: bytes):
+        return self._serial.write(data)
+
+
+    def _record(self, received: bytes):
+        now = time.perf_counter() - self._start_time
+        if self._chunk_time is None or now - self._chunk_time > _COALESCE_SECONDS:
+            self._write_chunk()
+            self._chunk_time = now
+        self._chunk += received
+
+
+    def _write_chunk(self):
+        if self._chunk:
+            self._file.write(_CHUNK_HEADER.pack(self._chunk_time, len(self._chunk)))
+            self._file.write(self._chunk)
+            self._chunk.clear()
+
+
+    def close(self):
+        if not self._file.closed:
+            self._write_chunk()
+            self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *_):
+        self.close()
+
+
+# Stand-in for a Serial object that plays back a capture file. With a speed of
+# 1 the bytes become available at the pace they were recorded, a higher speed
+# plays back faster and a speed of None makes everything available at once.
+# Like pyserial, read() waits up to timeout seconds for data to arrive.
+class ReplaySerial:
+    def __init__(self, path: Path, speed: float | None = 1.0, timeout: float = 0):
+        self._chunks = read_capture(path)
+        self._speed = speed
+        self._start_time: float = None
+        self.timeout = timeout
+
+        self._chunk_index = 0
+        self._buffer = bytearray()
+        self.is_open = True
+
+
+    @property
+    def finished(self):
+        return self._chunk_index == len(self._chunks) and not self._buffer
+
+
+    @property
+    def in_waiting(self):
+        self._release_due_chunks()
+        return len(self._buffer)
+
+
+    def read(self, size: int = 1) -> bytes:
+        self._release_due_chunks()
+        if not self._buffer and self.timeout:
+            self._wait_for_chunk(self.timeout)
+
+        received = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return received
+
+
+    def write(self, data: bytes):
+        # Commands have nowhere to go during a replay.
+        return len(data)
+
+
+    def _elapsed(self) -> float:
+        if self._speed is None:
+            return float('inf')
+
+        if self._start_time is None:
+            self._start_time = time.perf_counter()
+        return (time.perf_counter() - self._start_time) * self._speed
+
+
+    def _wait_for_chunk(self, timeout: float):
+        if self._chunk_index < len(self._chunks):
+            timestamp, _ = self._chunks[self._chunk_index]
+            time.sleep(min(timeout, max(0, (timestamp - self._elapsed()) / self._speed)))
+        else:
+            time.sleep(timeout)
+        self._release_due_chunks()
+
+
+    def _release_due_chunks(self):
+        elapsed = self._elapsed()
+
+        while self._chunk_index < len(self._chunks):
+            timestamp, chunk = self._chunks[self._chunk_index]
+            if timestamp > elapsed:
+                break
+            self._buffer += chunk
+            self._chunk_index += 1
+
+
+    def close(self):
+        self.is_open = False
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *_):
+        self.close()
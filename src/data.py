@@ -3,11 +3,53 @@ from __future__ import annotations
 from dataclasses import dataclass
 from struct import unpack
 
+import numpy as np
+
 dataSize = 27
 dropDataSize = 16
 
-
-@dataclass
+# Layouts of the frames as sent by the CanSat, matching '<hhhhhhLhhhhBBB' and
+# '<hhhhhhL'. Numpy does not pad these, so the item sizes equal the frame sizes.
+dataDtype = np.dtype([
+    ('acceleration', '<i2', (3,)),
+    ('gyroscope', '<i2', (3,)),
+    ('time', '<u4'),
+    ('temperature_outside', '<i2'),
+    ('distance', '<i2'),
+    ('air_quality', '<i2'),
+    ('sound', '<i2'),
+    ('temperature_inside', 'u1'),
+    ('humidity_inside', 'u1'),
+    ('humidity_outside', 'u1')
+])
+dropDataDtype = np.dtype([
+    ('acceleration', '<i2', (3,)),
+    ('gyroscope', '<i2', (3,)),
+    ('time', '<u4')
+])
+
+# Layouts of deserialized batches. Missing values are NaN instead of None.
+decodedDataDtype = np.dtype([
+    ('acceleration', '<f8', (3,)),
+    ('gyroscope', '<f8', (3,)),
+    ('time', '<i8'),
+    ('temperature_outside', '<f8'),
+    ('distance', '<f8'),
+    ('air_quality', '<f8'),
+    ('sound', '<f8'),
+    ('temperature_inside', '<f8'),
+    ('humidity_inside', '<f8'),
+    ('humidity_outside', '<f8')
+])
+decodedDropDataDtype = np.dtype([
+    ('acceleration', '<f8', (3,)),
+    ('gyroscope', '<f8', (3,)),
+    ('time', '<i8')
+])
+
+
+# The sample types use slots to keep the per-frame allocations small.
+@dataclass(slots=True)
 class Vector:
     x: float
     y: float
@@ -22,7 +64,14 @@ class Vector:
         )
 
 
-@dataclass
+    def __isub__(self, other: Vector):
+        self.x -= other.x
+        self.y -= other.y
+        self.z -= other.z
+        return self
+
+
+@dataclass(slots=True)
 class Data:
     acceleration: Vector
     gyroscope: Vector
@@ -36,13 +85,60 @@ class Data:
     humidity_outside: int
 
 
-@dataclass
+@dataclass(slots=True)
 class DropData:
     acceleration: Vector
     gyroscope: Vector
     time: int
 
 
+# Every scalar in a sample, as (field, vector component), and their names.
+sampleComponents = [
+    ('acceleration', 'x'),
+    ('acceleration', 'y'),
+    ('acceleration', 'z'),
+    ('gyroscope', 'x'),
+    ('gyroscope', 'y'),
+    ('gyroscope', 'z'),
+    ('temperature_outside', None),
+    ('distance', None),
+    ('air_quality', None),
+    ('sound', None),
+    ('temperature_inside', None),
+    ('humidity_inside', None),
+    ('humidity_outside', None)
+]
+componentNames = [
+    field if component is None else f'{field}_{component}'
+    for field, component in sampleComponents
+]
+
+
+# The values of sampleComponents in a sample, with None for missing values.
+def componentValues(data: Data | DropData) -> list[float | None]:
+    values = []
+    for field, component in sampleComponents:
+        value = getattr(data, field, None)
+        if value is not None and component is not None:
+            value = getattr(value, component)
+        values.append(value)
+    return values
+
+
+# Same as dataclasses.asdict but without the deep copy, and with missing
+# values left out.
+def toDictionary(data: Data | DropData) -> dict:
+    dictionary = {}
+    for name in data.__slots__:
+        value = getattr(data, name)
+        if value is None:
+            continue
+        if type(value) is Vector:
+            value = { 'x': value.x, 'y': value.y, 'z': value.z }
+        dictionary[name] = value
+    return dictionary
+
+
 # Missing data sent as -1 will be changed to None.
 # Not all sensors return errors.
 def convertNegativeToNone(number: int | float) -> int | float | None:
@@ -105,3 +201,42 @@ def deserializeDropData(serialized: bytes) -> DropData:
     )
 
     return data
+
+
+def _convertNegativeToNan(numbers: np.ndarray) -> np.ndarray:
+    return np.where(numbers < 0, np.nan, numbers)
+
+
+def _convert255ToNan(numbers: np.ndarray) -> np.ndarray:
+    return np.where(numbers == 255, np.nan, numbers)
+
+
+# Deserializes a buffer of concatenated DATA frames (without headers) into a
+# structured array with the decodedDataDtype layout.
+def deserializeDataBatch(serialized: bytes) -> np.ndarray:
+    frames = np.frombuffer(serialized, dtype=dataDtype)
+    data = np.empty(len(frames), dtype=decodedDataDtype)
+
+    data['acceleration'] = frames['acceleration'] / 1000
+    data['gyroscope'] = frames['gyroscope'] / 1000
+    data['time'] = frames['time']
+    data['temperature_outside'] = _convertNegativeToNan(frames['temperature_outside'] / 1000)
+    data['distance'] = _convertNegativeToNan(frames['distance'])
+    data['air_quality'] = frames['air_quality']
+    data['sound'] = frames['sound']
+    data['temperature_inside'] = _convert255ToNan(frames['temperature_inside'])
+    data['humidity_inside'] = _convert255ToNan(frames['humidity_inside'])
+    data['humidity_outside'] = _convert255ToNan(frames['humidity_outside'])
+
+    return data
+
+
+def deserializeDropDataBatch(serialized: bytes) -> np.ndarray:
+    frames = np.frombuffer(serialized, dtype=dropDataDtype)
+    data = np.empty(len(frames), dtype=decodedDropDataDtype)
+
+    data['acceleration'] = frames['acceleration'] / 1000
+    data['gyroscope'] = frames['gyroscope'] / 1000
+    data['time'] = frames['time']
+
+    return data
@@ -0,0 +1,203 @@
+from enum import Enum
+import math
+
+from .data import Vector, Data, DropData, componentValues, sampleComponents
+from .wire import Sample
+
+
+class DecimationMode(Enum):
+    # Send every sample.
+    NONE = 'none'
+    # Keep the samples holding the smallest and largest value of each channel.
+    MINMAX = 'minmax'
+    # Largest-Triangle-Three-Buckets, delayed by one bucket.
+    LTTB = 'lttb'
+    # Send the mean of each channel.
+    AVERAGE = 'average'
+
+
+# Reduces a stream of samples to roughly points_per_second points per channel.
+# Samples are grouped in buckets by their CanSat time and each bucket is
+# replaced by the samples or values that represent it best, so short spikes are
+# kept instead of being skipped over like with a fixed send interval.
+class Decimator:
+    def __init__(self, mode: DecimationMode, points_per_second: float):
+        if not (math.isfinite(points_per_second) and points_per_second > 0):
+            raise ValueError(f'Rate must be a positive number: {points_per_second}')
+
+        self._mode = mode
+        self._bucket_duration = 1000 / points_per_second
+
+        self._bucket: list[Sample] = []
+        self._bucket_end: float = None
+
+        # The LTTB state: the bucket waiting for the next one, and the point
+        # last selected for each component.
+        self._pending: list[Sample] = []
+        self._selected: list[tuple[int, float] | None] = [None] * len(sampleComponents)
+
+
+    @property
+    def mode(self):
+        return self._mode
+
+
+    @property
+    def points_per_second(self):
+        return 1000 / self._bucket_duration
+
+
+    def add(self, sample: Sample) -> list[Sample]:
+        if self._mode == DecimationMode.NONE:
+            return [sample]
+
+        time = sample.data.time
+        released = []
+
+        if self._bucket_end is None:
+            self._bucket_end = self._next_bucket_end(time)
+        elif time >= self._bucket_end:
+            released = self._close_bucket()
+            self._bucket_end = self._next_bucket_end(time)
+
+        self._bucket.append(sample)
+        return released
+
+
+    # What the samples not released yet would be reduced to if the bucket
+    # closed now, without closing it. For LTTB this includes the bucket
+    # waiting for the next one.
+    def peek(self) -> list[Sample]:
+        match self._mode:
+            case DecimationMode.NONE:
+                return []
+            case DecimationMode.MINMAX:
+                return self._min_max(self._bucket)
+            case DecimationMode.AVERAGE:
+                return [self._average(self._bucket)] if self._bucket else []
+            case DecimationMode.LTTB:
+                selected = list(self._selected)
+                peeked = self._largest_triangles(self._pending, self._bucket) + self._largest_triangles(self._bucket, [])
+                self._selected = selected
+                return peeked
+
+
+    # Releases the samples not released yet and starts over with an empty
+    # bucket, for example before the decimator is replaced or when no samples
+    # arrived for a while.
+    def flush(self) -> list[Sample]:
+        released = self.peek()
+        self._bucket = []
+        self._bucket_end = None
+        self._pending = []
+        return released
+
+
+    def _next_bucket_end(self, time: int) -> float:
+        return (time // self._bucket_duration + 1) * self._bucket_duration
+
+
+    def _close_bucket(self) -> list[Sample]:
+        bucket = self._bucket
+        self._bucket = []
+
+        match self._mode:
+            case DecimationMode.MINMAX:
+                return self._min_max(bucket)
+            case DecimationMode.AVERAGE:
+                return [self._average(bucket)]
+            case DecimationMode.LTTB:
+                released = self._largest_triangles(self._pending, bucket)
+                self._pending = bucket
+                return released
+
+
+    @staticmethod
+    def _select(bucket: list[Sample], indices: set[int]) -> list[Sample]:
+        return sorted((bucket[index] for index in indices), key=lambda sample: sample.data.time)
+
+
+    def _min_max(self, bucket: list[Sample]) -> list[Sample]:
+        values = [componentValues(sample.data) for sample in bucket]
+
+        indices = set()
+        for component in range(len(sampleComponents)):
+            present = [
+                (sample_values[component], index)
+                for index, sample_values in enumerate(values)
+                if sample_values[component] is not None
+            ]
+            if present:
+                indices.add(min(present)[1])
+                indices.add(max(present)[1])
+
+        return self._select(bucket, indices)
+
+
+    def _average(self, bucket: list[Sample]) -> Sample:
+        values = [componentValues(sample.data) for sample in bucket]
+
+        means = []
+        for component in range(len(sampleComponents)):
+            present = [sample_values[component] for sample_values in values if sample_values[component] is not None]
+            means.append(sum(present) / len(present) if present else None)
+
+        time = round(sum(sample.data.time for sample in bucket) / len(bucket))
+        acceleration = Vector(*means[0:3]) if means[0] is not None else None
+        gyroscope = Vector(*means[3:6]) if means[3] is not None else None
+
+        if any(type(sample.data) is Data for sample in bucket):
+            data = Data(acceleration, gyroscope, time, *means[6:])
+        else:
+            data = DropData(acceleration, gyroscope, time)
+
+        # Counts as received when the oldest sample of the bucket was.
+        received = [sample.received for sample in bucket if sample.received is not None]
+        return Sample(data, min(received) if received else None)
+
+
+    # Selects, for each component, the point in the bucket that forms the
+    # largest triangle with the previously selected point and the mean of the
+    # next bucket.
+    def _largest_triangles(self, bucket: list[Sample], next_bucket: list[Sample]) -> list[Sample]:
+        if not bucket:
+            return []
+
+        values = [componentValues(sample.data) for sample in bucket]
+        next_values = [componentValues(sample.data) for sample in next_bucket]
+
+        indices = set()
+        for component in range(len(sampleComponents)):
+            points = [
+                (bucket[index].data.time, sample_values[component], index)
+                for index, sample_values in enumerate(values)
+                if sample_values[component] is not None
+            ]
+            if not points:
+                continue
+
+            previous = self._selected[component]
+            if previous is None:
+                best = points[0]
+            else:
+                next_points = [
+                    (sample.data.time, sample_values[component])
+                    for sample, sample_values in zip(next_bucket, next_values)
+                    if sample_values[component] is not None
+                ]
+                if next_points:
+                    next_time = sum(point[0] for point in next_points) / len(next_points)
+                    next_value = sum(point[1] for point in next_points) / len(next_points)
+                else:
+                    next_time, next_value = previous
+
+                previous_time, previous_value = previous
+                best = max(points, key=lambda point: abs(
+                    (previous_time - next_time) * (point[1] - previous_value)
+                    - (previous_time - point[0]) * (next_value - previous_value)
+                ))
+
+            self._selected[component] = (best[0], best[1])
+            indices.add(best[2])
+
+        return self._select(bucket, indices)
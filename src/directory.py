@@ -1,77 +1,125 @@
-import csv
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 from .data import Vector, Data, DropData
-
-
+from .flight_log import (
+    DATA_LOG_NAME, DROP_LOG_NAME, DATA_FIELDS, DROP_FIELDS,
+    FlightLogWriter, data_record, drop_record
+)
+from .rolling import Anomaly
+from .segments import SegmentPolicy, SegmentedChannelWriter
+from .writer import FlushPolicy, TelemetryWriter
+
+_VECTOR_FIELDNAMES = ['time', 'x', 'y', 'z']
+_NUMBER_FIELDNAMES = ['time', 'data']
+
+_ANOMALY_FIELDNAMES = ['time', 'channel', 'value', 'mean', 'deviation', 'score']
+
+VECTOR_CHANNELS = ['acceleration', 'gyroscope']
+NUMBER_CHANNELS = [
+    'temperature_outside',
+    'distance',
+    'air_quality',
+    'sound',
+    'temperature_inside',
+    'humidity_inside',
+    'humidity_outside'
+]
+
+
+# With a segment policy the CSV files are rotated and the finished segments
+# compressed on a background thread, see SegmentedChannelWriter.
 class Directory:
-    def __init__(self):
+    def __init__(self, root: Path = Path('data'), policy: FlushPolicy = None, flight_log: bool = True,
+                 segments: SegmentPolicy = None):
         date_string = datetime.today().strftime("%Y-%m-%d_%H.%M.%S")
-        self._directory = Path('data', date_string)
+        self._directory = Path(root, date_string)
         self._directory.mkdir()
-        
-        self._initialize_vector_file(self._directory / 'acceleration.csv')
-        self._initialize_vector_file(self._directory / 'gyroscope.csv')
-        self._initialize_number_file(self._directory / 'temperature_outside.csv')
-        self._initialize_number_file(self._directory / 'distance.csv')
-        self._initialize_number_file(self._directory / 'air_quality.csv')
-        self._initialize_number_file(self._directory / 'sound.csv')
-        self._initialize_number_file(self._directory / 'temperature_inside.csv')
-        self._initialize_number_file(self._directory / 'humidity_inside.csv')
-        self._initialize_number_file(self._directory / 'humidity_outside.csv')
+
+        self._writer = TelemetryWriter(policy)
+        self._segments = segments
+        self._compression: ThreadPoolExecutor = None
+        if segments is not None:
+            self._compression = ThreadPoolExecutor(1, thread_name_prefix='compression')
+
+        for channel in VECTOR_CHANNELS:
+            self._initialize_file(channel, _VECTOR_FIELDNAMES)
+        for channel in NUMBER_CHANNELS:
+            self._initialize_file(channel, _NUMBER_FIELDNAMES)
+        self._initialize_file('anomalies', _ANOMALY_FIELDNAMES)
+
+        self._flight_log = flight_log
+        if flight_log:
+            self._writer.add_channel('data_log', FlightLogWriter(self._directory / DATA_LOG_NAME, 'data', DATA_FIELDS))
+            self._writer.add_channel('drop_log', FlightLogWriter(self._directory / DROP_LOG_NAME, 'drop', DROP_FIELDS))
+
+
+    @property
+    def path(self):
+        return self._directory
 
 
     def saveData(self, data: Data):
-        self._save_vector_if_not_none(self._directory / 'acceleration.csv', data.time, data.acceleration)
-        self._save_vector_if_not_none(self._directory / 'gyroscope.csv', data.time, data.gyroscope)
-        self._save_number_if_not_none(self._directory / 'temperature_outside.csv', data.time, data.temperature_outside)
-        self._save_number_if_not_none(self._directory / 'distance.csv', data.time, data.distance)
-        self._save_number_if_not_none(self._directory / 'air_quality.csv', data.time, data.air_quality)
-        self._save_number_if_not_none(self._directory / 'sound.csv', data.time, data.sound)
-        self._save_number_if_not_none(self._directory / 'temperature_inside.csv', data.time, data.temperature_inside)
-        self._save_number_if_not_none(self._directory / 'humidity_inside.csv', data.time, data.humidity_inside)
-        self._save_number_if_not_none(self._directory / 'humidity_outside.csv', data.time, data.humidity_outside)
+        self._save_vector_if_not_none('acceleration', data.time, data.acceleration)
+        self._save_vector_if_not_none('gyroscope', data.time, data.gyroscope)
+        self._save_number_if_not_none('temperature_outside', data.time, data.temperature_outside)
+        self._save_number_if_not_none('distance', data.time, data.distance)
+        self._save_number_if_not_none('air_quality', data.time, data.air_quality)
+        self._save_number_if_not_none('sound', data.time, data.sound)
+        self._save_number_if_not_none('temperature_inside', data.time, data.temperature_inside)
+        self._save_number_if_not_none('humidity_inside', data.time, data.humidity_inside)
+        self._save_number_if_not_none('humidity_outside', data.time, data.humidity_outside)
+
+        if self._flight_log:
+            self._writer.write('data_log', data_record(data))
 
 
     def saveDropData(self, data: DropData):
-        self._save_vector_if_not_none(self._directory / 'acceleration.csv', data.time, data.acceleration)
-        self._save_vector_if_not_none(self._directory / 'gyroscope.csv', data.time, data.gyroscope)
+        self._save_vector_if_not_none('acceleration', data.time, data.acceleration)
+        self._save_vector_if_not_none('gyroscope', data.time, data.gyroscope)
 
+        if self._flight_log:
+            self._writer.write('drop_log', drop_record(data))
 
-    def _save_vector_if_not_none(self, path: Path, time: int, data: Vector):
-        if data is not None:
-            self._save_vector(path, time, data)
 
+    def saveAnomalies(self, anomalies: list[Anomaly]):
+        for anomaly in anomalies:
+            self._writer.write('anomalies', (
+                anomaly.time, anomaly.channel, anomaly.value,
+                anomaly.mean, anomaly.deviation, anomaly.score
+            ))
 
-    def _save_number_if_not_none(self, path: Path, time: int, data: int | float):
-        if data is not None:
-            self._save_number(path, time, data)
 
+    def flush_if_due(self):
+        self._writer.flush_if_due()
 
-    def _initialize_vector_file(self, path: Path):
-        with path.open('w', newline='') as file:
-            fieldnames = ['time', 'x', 'y', 'z']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
 
+    def checkpoint(self):
+        self._writer.sync()
 
-    def _initialize_number_file(self, path: Path):
-        with path.open('w', newline='') as file:
-            fieldnames = ['time', 'data']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
 
+    def close(self):
+        self._writer.close()
+        if self._compression is not None:
+            self._compression.shutdown()
 
-    def _save_vector(self, path: Path, time: int, vector: Vector):
-        with path.open('a', newline='') as file:
-            fieldnames = ['time', 'x', 'y', 'z']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writerow({ 'time': time, 'x': vector.x, 'y': vector.y, 'z': vector.z })
+
+    def _save_vector_if_not_none(self, channel: str, time: int, data: Vector):
+        if data is not None:
+            self._writer.write(channel, (time, data.x, data.y, data.z))
+
+
+    def _save_number_if_not_none(self, channel: str, time: int, data: int | float):
+        if data is not None:
+            self._writer.write(channel, (time, data))
 
 
-    def _save_number(self, path: Path, time: int, number: int | float):
-        with path.open('a', newline='') as file:
-            fieldnames = ['time', 'data']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writerow({ 'time': time, 'data': number })
+    def _initialize_file(self, channel: str, fieldnames: list[str]):
+        if self._segments is not None:
+            self._writer.add_channel(channel, SegmentedChannelWriter(
+                self._directory, channel, fieldnames, self._segments, self._compression
+            ))
+        else:
+            path = self._directory / f'{channel}.csv'
+            self._writer.open_channel(channel, path, fieldnames)
@@ -0,0 +1,146 @@
+import json
+import math
+import os
+from pathlib import Path
+from struct import Struct
+
+import numpy as np
+
+from .data import Vector, Data, DropData
+
+# File layout:
+#   magic (8 bytes) | version (u4) | schema length (u4) | schema JSON | padding
+#   record | record | ...
+# The header is padded to a multiple of _HEADER_ALIGNMENT so the records can be
+# memory mapped directly. Missing values are stored as NaN.
+_MAGIC = b'CANSATFL'
+_VERSION = 1
+_PREFIX = Struct('<8sII')
+_HEADER_ALIGNMENT = 64
+
+_MISSING = math.nan
+
+DATA_LOG_NAME = 'data.bin'
+DROP_LOG_NAME = 'drop.bin'
+
+DATA_FIELDS = [
+    ('time', '<i8'),
+    ('acceleration_x', '<f8'),
+    ('acceleration_y', '<f8'),
+    ('acceleration_z', '<f8'),
+    ('gyroscope_x', '<f8'),
+    ('gyroscope_y', '<f8'),
+    ('gyroscope_z', '<f8'),
+    ('temperature_outside', '<f8'),
+    ('distance', '<f8'),
+    ('air_quality', '<f8'),
+    ('sound', '<f8'),
+    ('temperature_inside', '<f8'),
+    ('humidity_inside', '<f8'),
+    ('humidity_outside', '<f8')
+]
+
+DROP_FIELDS = DATA_FIELDS[:7]
+
+
+def _struct_format(fields: list[tuple[str, str]]) -> str:
+    formats = {'<i8': 'q', '<f8': 'd'}
+    return '<' + ''.join(formats[field_format] for _, field_format in fields)
+
+
+def _encode_header(record: str, fields: list[tuple[str, str]]) -> bytes:
+    schema = json.dumps({ 'record': record, 'fields': fields }).encode()
+    header = _PREFIX.pack(_MAGIC, _VERSION, len(schema)) + schema
+    padding = -len(header) % _HEADER_ALIGNMENT
+    return header + b' ' * padding
+
+
+def read_header(path: Path) -> tuple[dict, int]:
+    with Path(path).open('rb') as file:
+        magic, version, schema_length = _PREFIX.unpack(file.read(_PREFIX.size))
+        if magic != _MAGIC:
+            raise ValueError(f'{path} is not a flight log.')
+        if version != _VERSION:
+            raise ValueError(f'Unsupported flight log version {version}.')
+        schema = json.loads(file.read(schema_length))
+
+    header_size = _PREFIX.size + schema_length
+    header_size += -header_size % _HEADER_ALIGNMENT
+    return schema, header_size
+
+
+def _value_or_missing(value: int | float | None) -> float:
+    return _MISSING if value is None else value
+
+
+def _vector_or_missing(vector: Vector | None) -> tuple[float, float, float]:
+    if vector is None:
+        return (_MISSING, _MISSING, _MISSING)
+    else:
+        return (vector.x, vector.y, vector.z)
+
+
+def data_record(data: Data) -> tuple:
+    return (
+        data.time,
+        *_vector_or_missing(data.acceleration),
+        *_vector_or_missing(data.gyroscope),
+        _value_or_missing(data.temperature_outside),
+        _value_or_missing(data.distance),
+        _value_or_missing(data.air_quality),
+        _value_or_missing(data.sound),
+        _value_or_missing(data.temperature_inside),
+        _value_or_missing(data.humidity_inside),
+        _value_or_missing(data.humidity_outside)
+    )
+
+
+def drop_record(data: DropData) -> tuple:
+    return (
+        data.time,
+        *_vector_or_missing(data.acceleration),
+        *_vector_or_missing(data.gyroscope)
+    )
+
+
+class FlightLogWriter:
+    def __init__(self, path: Path, record: str, fields: list[tuple[str, str]]):
+        self._struct = Struct(_struct_format(fields))
+        self._file = Path(path).open('xb')
+        self._file.write(_encode_header(record, fields))
+        self._buffer = bytearray()
+
+
+    def write(self, row: tuple):
+        self._buffer += self._struct.pack(*row)
+
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+
+
+    def sync(self):
+        self.flush()
+        os.fsync(self._file.fileno())
+
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+def read_flight_log(path: Path) -> np.memmap:
+    schema, header_size = read_header(path)
+    dtype = np.dtype([tuple(field) for field in schema['fields']])
+
+    # Ignore a partially written record at the end of a log that was not
+    # closed cleanly.
+    count = (os.path.getsize(path) - header_size) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode='r', offset=header_size, shape=(count,))
@@ -0,0 +1,115 @@
+import math
+import random
+from struct import Struct
+
+from .relay import MessageType, checked_frame
+
+# The payloads as the CanSat packs them, see deserializeData.
+_DATA = Struct('<hhhhhhLhhhhBBB')
+_DROP = Struct('<hhhhhhL')
+_HEADER = b'01'
+
+
+def _clamp(value: float, low: int, high: int) -> int:
+    return max(low, min(high, round(value)))
+
+
+# Makes valid DATA, DROP and TEXT frames like the ground station Arduino sends
+# them, at fixed rates in CanSat time. The sensor values follow slow sine
+# waves with gaussian noise, where noise is the standard deviation relative
+# to the range of each sensor. A corruption of 0.1 flips a random bit in one
+# frame out of ten.
+class TelemetryGenerator:
+    def __init__(self, data_rate: float = 100, drop_rate: float = 0, text_rate: float = 0,
+                 noise: float = 0.01, corruption: float = 0.0, checksum: bool = False, seed: int = 0):
+        self._streams = [
+            (rate, kind)
+            for rate, kind in ((data_rate, MessageType.DATA), (drop_rate, MessageType.DROP), (text_rate, MessageType.TEXT))
+            if rate > 0
+        ]
+        self._noise = noise
+        self._corruption = corruption
+        self._checksum = checksum
+        self._random = random.Random(seed)
+
+
+    # Yields (CanSat time in ms, frame) for every frame sent in the first
+    # duration milliseconds, in time order. The station tells frames apart by
+    # their time, so a frame due in the same millisecond as the previous one
+    # gets the next free millisecond, like the CanSat sending them one after
+    # the other.
+    def frames(self, duration: int):
+        next_times = [0.0] * len(self._streams)
+        previous = -1
+
+        while True:
+            index = min(range(len(self._streams)), key=next_times.__getitem__)
+            time = max(int(next_times[index]), previous + 1)
+            if time >= duration:
+                return
+
+            rate, kind = self._streams[index]
+            next_times[index] += 1000 / rate
+            previous = time
+            yield time, self._corrupt(self._frame(kind, time))
+
+
+    def _frame(self, kind: MessageType, time: int) -> bytes:
+        match kind:
+            case MessageType.DATA:
+                payload = self._data(time)
+            case MessageType.DROP:
+                payload = self._drop(time)
+            case MessageType.TEXT:
+                return _HEADER + bytes([kind]) + f'Status at {time} ms'.encode() + b'\n'
+
+        if self._checksum:
+            checked = MessageType.CHECKED_DATA if kind == MessageType.DATA else MessageType.CHECKED_DROP
+            return checked_frame(checked, payload)
+        return _HEADER + bytes([kind]) + payload
+
+
+    def _signal(self, time: int, period: float, center: float, amplitude: float, span: float) -> float:
+        return (
+            center + amplitude * math.sin(2 * math.pi * time / period)
+            + self._random.gauss(0, self._noise * span)
+        )
+
+
+    def _motion(self, time: int) -> list[int]:
+        # Acceleration in thousandths of g and rotation in thousandths of °/s.
+        return [
+            _clamp(self._signal(time, 5000, 0, 50, 4000), -32768, 32767),
+            _clamp(self._signal(time, 7000, 0, 50, 4000), -32768, 32767),
+            _clamp(self._signal(time, 3000, 1000, 50, 4000), -32768, 32767),
+            _clamp(self._signal(time, 4000, 0, 5000, 500000), -32768, 32767),
+            _clamp(self._signal(time, 6000, 0, 5000, 500000), -32768, 32767),
+            _clamp(self._signal(time, 8000, 0, 5000, 500000), -32768, 32767)
+        ]
+
+
+    def _data(self, time: int) -> bytes:
+        return _DATA.pack(
+            *self._motion(time),
+            time,
+            _clamp(self._signal(time, 60000, 15000, 2000, 50000), -32768, 32767),
+            _clamp(self._signal(time, 20000, 150, 100, 300), -1, 300),
+            _clamp(self._signal(time, 30000, 300, 50, 1023), 0, 1023),
+            _clamp(self._signal(time, 2000, 400, 200, 1023), 0, 1023),
+            _clamp(self._signal(time, 60000, 22, 2, 100), 0, 254),
+            _clamp(self._signal(time, 60000, 40, 5, 100), 0, 100),
+            _clamp(self._signal(time, 60000, 60, 5, 100), 0, 100)
+        )
+
+
+    def _drop(self, time: int) -> bytes:
+        return _DROP.pack(*self._motion(time), time)
+
+
+    def _corrupt(self, frame: bytes) -> bytes:
+        if self._corruption <= 0 or self._random.random() >= self._corruption:
+            return frame
+
+        corrupted = bytearray(frame)
+        corrupted[self._random.randrange(len(corrupted))] ^= 1 << self._random.randrange(8)
+        return bytes(corrupted)
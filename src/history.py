@@ -0,0 +1,49 @@
+from collections import deque
+import heapq
+
+from .data import sampleComponents
+from .decimation import DecimationMode, Decimator
+from .wire import Sample
+
+
+# The recent samples, decimated, for clients that connect in the middle of a
+# session. Every kind of sample has its own ring so the frequent DROP frames do
+# not push the DATA samples out. Samples older than duration milliseconds
+# before the newest one are forgotten.
+class History:
+    def __init__(self, duration: int, points_per_second: float, mode: DecimationMode = DecimationMode.MINMAX):
+        self._duration = duration
+        self._points_per_second = points_per_second
+        self._mode = mode
+        # A bucket keeps at most two samples per component.
+        self._max_length = int(duration / 1000 * points_per_second * 2 * len(sampleComponents)) + 1
+
+        self._rings: dict[type, deque[Sample]] = {}
+        self._decimators: dict[type, Decimator] = {}
+
+
+    def __len__(self):
+        return sum(len(ring) for ring in self._rings.values())
+
+
+    def add(self, sample: Sample):
+        kind = type(sample.data)
+        ring = self._rings.get(kind)
+        if ring is None:
+            ring = self._rings[kind] = deque(maxlen=self._max_length)
+            self._decimators[kind] = Decimator(self._mode, self._points_per_second)
+
+        for decimated in self._decimators[kind].add(sample):
+            ring.append(decimated)
+
+        if ring:
+            oldest = ring[-1].data.time - self._duration
+            while ring[0].data.time < oldest:
+                ring.popleft()
+
+
+    # The kept samples of every kind, sorted by time, including the open
+    # buckets so that a new subscriber misses nothing before its live stream.
+    def snapshot(self) -> list[Sample]:
+        kinds = [list(ring) + self._decimators[kind].peek() for kind, ring in self._rings.items()]
+        return list(heapq.merge(*kinds, key=lambda sample: sample.data.time))
@@ -0,0 +1,134 @@
+from collections import deque
+import statistics
+
+from .metrics import Metrics
+
+# Frame rejections in the relay that mean corrupted bytes were received.
+_CORRUPTION_REASONS = ('timeout', 'message_type', 'checksum', 'truncated', 'unchecked')
+
+
+# Link figures for one kind of frame, inferred from the CanSat timestamps. The
+# CanSat sends at a steady rate, so the expected cadence is the median step
+# between consecutive timestamps and a larger step means frames were lost.
+class LinkStream:
+    def __init__(self, window: int):
+        # (cadence steps covered, arrival time) of the last frames in order.
+        self._recent: deque[tuple[int, float]] = deque(maxlen=window)
+        self._steps: deque[int] = deque(maxlen=window)
+        self._cadence: float = None
+        self._latest: int = None
+        self._latest_arrival: float = None
+
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.max_reorder_depth = 0
+        # Interarrival jitter in milliseconds as in RFC 3550.
+        self.jitter = 0.0
+
+
+    @property
+    def cadence(self):
+        return self._cadence
+
+
+    def add(self, time: int, arrival: float):
+        self.received += 1
+
+        if self._latest is None:
+            self._latest = time
+            self._latest_arrival = arrival
+            self._recent.append((1, arrival))
+            return
+
+        step = time - self._latest
+        if step <= 0:
+            # Arrived after a newer frame, so it was counted as lost before.
+            self.reordered += 1
+            if self._cadence:
+                depth = round(-step / self._cadence)
+                self.max_reorder_depth = max(self.max_reorder_depth, depth)
+            if self.lost > 0:
+                self.lost -= 1
+            self._recent.append((0, arrival))
+            return
+
+        transit_change = (arrival - self._latest_arrival) * 1000 - step
+        self.jitter += (abs(transit_change) - self.jitter) / 16
+
+        self._steps.append(step)
+        # The median is only updated now and then, it changes slowly.
+        if self._cadence is None or len(self._steps) % 16 == 0:
+            self._cadence = statistics.median(self._steps)
+
+        covered = max(1, round(step / self._cadence))
+        self.lost += covered - 1
+        self._recent.append((covered, arrival))
+
+        self._latest = time
+        self._latest_arrival = arrival
+
+
+    def summary(self) -> dict:
+        # Loss and packet rate over the last window frames.
+        expected = sum(covered for covered, _ in self._recent)
+        recent_loss = 1 - len(self._recent) / expected if expected else 0.0
+        span = self._recent[-1][1] - self._recent[0][1] if len(self._recent) > 1 else 0
+        packet_rate = (len(self._recent) - 1) / span if span > 0 else None
+
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'loss': self.lost / (self.received + self.lost) if self.received else 0.0,
+            'recent_loss': max(0.0, recent_loss),
+            'packet_rate': packet_rate,
+            'cadence_ms': self._cadence,
+            'jitter_ms': self.jitter,
+            'reordered': self.reordered,
+            'max_reorder_depth': self.max_reorder_depth
+        }
+
+
+# Tracks the quality of the radio link: loss, jitter and reordering of every
+# kind of frame, and the corrupted frames and resync bytes counted by the
+# relay in the station metrics.
+class LinkMonitor:
+    def __init__(self, metrics: Metrics, window: int = 500):
+        self._metrics = metrics
+        self._window = window
+        self._streams: dict[str, LinkStream] = {}
+        # Relay counts at the previous report, to report rates.
+        self._previous: tuple[int, int, float] = None
+        self.latest_report: dict = None
+
+
+    def add(self, kind: str, time: int, arrival: float):
+        stream = self._streams.get(kind)
+        if stream is None:
+            stream = self._streams[kind] = LinkStream(self._window)
+        stream.add(time, arrival)
+
+
+    # Summarises the link since the previous report, now is a perf_counter()
+    # time.
+    def report(self, now: float) -> dict:
+        corrupted = sum(self._metrics.count('rejected', reason) for reason in _CORRUPTION_REASONS)
+        discarded = self._metrics.count('discarded', 'bytes')
+        decoded = self._metrics.count('decoded')
+
+        corrupted_rate = discarded_rate = None
+        if self._previous is not None and now > self._previous[2]:
+            duration = now - self._previous[2]
+            corrupted_rate = (corrupted - self._previous[0]) / duration
+            discarded_rate = (discarded - self._previous[1]) / duration
+        self._previous = (corrupted, discarded, now)
+
+        self.latest_report = {
+            'streams': { kind: stream.summary() for kind, stream in self._streams.items() },
+            'corrupted_frames': corrupted,
+            'corrupted_ratio': corrupted / (corrupted + decoded) if corrupted + decoded else 0.0,
+            'corrupted_per_second': corrupted_rate,
+            'discarded_bytes': discarded,
+            'discarded_bytes_per_second': discarded_rate
+        }
+        return self.latest_report
@@ -11,6 +11,11 @@ const startStopButton = document.getElementById('startStop');
 const chartButtons = document.getElementsByClassName('chartButton');
 const toggleButtons = document.getElementsByClassName('toggleButton');
 const channelSelect = document.getElementById('channel');
+const decimationSelect = document.getElementById('decimation');
+const rateSelect = document.getElementById('rate');
+const healthText = document.getElementById('health');
+const linkText = document.getElementById('link');
+const commandText = document.getElementById('command');
 
 function getVisible() {
     for (const button of chartButtons) {
@@ -234,29 +239,161 @@ function storeData(data) {
         outside: humidity_outside ?? null,
         inside: humidity_inside ?? null
     });
+}
 
+function sortMeasurements() {
     // Sort the data in case the data was received out of order.
     for (const measurement_type in measurements) {
         measurements[measurement_type].sort((a, b) => { return a.time - b.time });
     }
 }
 
-const socket = new WebSocket("ws://localhost:8765");
+// The binary protocol batches several samples per message. Its layout is
+// described by src/wire.py and the schema message sent when connecting.
+const binaryProtocol = 'cansat.binary.v1';
+let schema = null;
+
+function decodeSamples(buffer) {
+    const view = new DataView(buffer);
+    const count = view.getUint16(1, true);
+    let offset = 3;
+
+    const samples = [];
+    for (let i = 0; i < count; ++i) {
+        const sample = { time: view.getUint32(offset + 1, true) };
+        const present = view.getUint16(offset + 5, true);
+        offset += 7;
+
+        schema.fields.forEach((field, bit) => {
+            if (!(present & (1 << bit))) {
+                return;
+            }
+            if (field.components.length > 0) {
+                sample[field.name] = {};
+                for (const component of field.components) {
+                    sample[field.name][component] = view.getFloat32(offset, true);
+                    offset += 4;
+                }
+            } else {
+                sample[field.name] = view.getFloat32(offset, true);
+                offset += 4;
+            }
+        });
 
-socket.onopen = _ => {
-    
-};
+        samples.push(sample);
+    }
+    return samples;
+}
 
-socket.onmessage = event => {
-    const received_data = JSON.parse(event.data);
-    storeData(received_data);
+let anomalyCount = 0;
+let latestAnomalies = 'none';
 
-    updateChart();
-};
+function showLink(report) {
+    const streams = Object.entries(report.streams).map(([kind, stream]) => {
+        const rate = (stream.packet_rate ?? 0).toFixed(1);
+        const loss = (stream.recent_loss * 100).toFixed(1);
+        return `${kind} ${rate}/s, ${loss}% lost, ${stream.jitter_ms.toFixed(1)} ms jitter`;
+    });
+    const corrupted = (report.corrupted_per_second ?? 0).toFixed(1);
 
-socket.onclose = _ => {
-    
-};
+    linkText.innerText = `Link: ${streams.join('; ')}; ${corrupted} corrupted/s`;
+    if (report.poor) {
+        linkText.innerText += ' (poor link, consider changing the radio channel)';
+    }
+    linkText.dataset.poor = report.poor;
+}
+
+// The station reports every command once the CanSat acknowledged it or it
+// gave up. Sensor buttons show the state the CanSat actually has.
+function showCommand(result) {
+    const button = document.querySelector(`.toggleButton[data-sensor="${result.action}"]`);
+    if (button !== null && result.enabled !== null) {
+        button.dataset.enabled = result.enabled;
+    }
+
+    if (result.status === 'acknowledged') {
+        commandText.innerText = `Command: ${result.action} ${result.value} acknowledged in ${result.round_trip_ms.toFixed(0)} ms`;
+    } else {
+        commandText.innerText = `Command: ${result.action} ${result.value} ${result.status}`;
+    }
+    commandText.innerText += ` (${result.attempts} ${result.attempts === 1 ? 'attempt' : 'attempts'})`;
+    commandText.dataset.status = result.status;
+}
+
+function clearMeasurements() {
+    for (const measurement_type in measurements) {
+        measurements[measurement_type] = [];
+    }
+}
+
+function handleStatus(message) {
+    switch (message.type) {
+        case 'schema':
+            schema = message;
+            return;
+        case 'history':
+            // The samples that follow replace what was received before.
+            clearMeasurements();
+            updateChart();
+            return;
+        case 'link':
+            showLink(message);
+            return;
+        case 'command':
+            showCommand(message);
+            return;
+        case 'anomalies':
+            latestAnomalies = message.anomalies
+                .map(anomaly => `${anomaly.channel} (${anomaly.score.toFixed(1)}σ)`)
+                .join(', ');
+            anomalyCount += message.anomalies.length;
+            break;
+        case 'statistics':
+            anomalyCount = message.anomaly_count;
+            break;
+    }
+
+    healthText.innerText = `Anomalies: ${anomalyCount}, latest: ${latestAnomalies}`;
+}
+
+// How long to wait before reconnecting after the connection was lost.
+const reconnectDelay = 1000;
+let socket;
+
+function connect() {
+    socket = new WebSocket("ws://localhost:8765", [binaryProtocol]);
+    socket.binaryType = 'arraybuffer';
+
+    socket.onopen = _ => {
+        sendCommand('Decimation', decimationSelect.value);
+        sendCommand('Rate', rateSelect.value);
+    };
+
+    socket.onmessage = event => {
+        if (typeof event.data === 'string') {
+            const received_data = JSON.parse(event.data);
+            if ('type' in received_data) {
+                handleStatus(received_data);
+                return;
+            }
+            storeData(received_data);
+        } else {
+            for (const sample of decodeSamples(event.data)) {
+                storeData(sample);
+            }
+        }
+
+        sortMeasurements();
+        updateChart();
+    };
+
+    socket.onclose = _ => {
+        // The station sends the recent history again when reconnected.
+        setTimeout(connect, reconnectDelay);
+    };
+}
+
+connect();
 
 function sendCommand(action, value) {
     socket.send(`${action}:${value}`);
@@ -312,3 +449,11 @@ for (const button of toggleButtons) {
 channelSelect.addEventListener('change', event => {
     sendCommand('Radio Channel', parseInt(event.target.value));
 });
+
+decimationSelect.addEventListener('change', event => {
+    sendCommand('Decimation', event.target.value);
+});
+
+rateSelect.addEventListener('change', event => {
+    sendCommand('Rate', event.target.value);
+});
@@ -0,0 +1,125 @@
+from bisect import bisect_left
+from collections import Counter
+import json
+from pathlib import Path
+import time
+
+
+# Upper bounds of the histogram buckets in seconds, from 10 µs to 10 s in
+# steps of roughly 1, 2 and 5.
+_LATENCY_BOUNDS = [
+    scale * step
+    for scale in (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+    for step in (1, 2, 5)
+] + [10.0]
+
+
+# Counts latencies in fixed buckets, so recording a value takes constant time
+# and memory no matter how long the session runs. Percentiles are reported as
+# the upper bound of the bucket they fall in.
+class Histogram:
+    def __init__(self, bounds: list[float] = _LATENCY_BOUNDS):
+        self._bounds = bounds
+        # The last bucket holds everything above the largest bound.
+        self._counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+
+    def observe(self, seconds: float):
+        self._counts[bisect_left(self._bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+
+    def percentile(self, fraction: float) -> float:
+        if self.count == 0:
+            return None
+
+        target = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= target:
+                break
+
+        return self._bounds[index] if index < len(self._bounds) else self.maximum
+
+
+    def summary(self) -> dict:
+        # Reported in milliseconds, like the CanSat time.
+        def milliseconds(seconds):
+            return None if seconds is None else seconds * 1000
+
+        return {
+            'count': self.count,
+            'mean_ms': milliseconds(self.total / self.count if self.count else None),
+            'p50_ms': milliseconds(self.percentile(0.5)),
+            'p90_ms': milliseconds(self.percentile(0.9)),
+            'p99_ms': milliseconds(self.percentile(0.99)),
+            'max_ms': milliseconds(self.maximum)
+        }
+
+
+# Counters and latency histograms for the whole station. Counters are grouped,
+# for example rejected frames by reason, and histograms are created the first
+# time a stage reports a latency.
+class Metrics:
+    def __init__(self):
+        self._started = time.time()
+        self._counters: dict[str, Counter] = {}
+        self._histograms: dict[str, Histogram] = {}
+
+
+    def increment(self, group: str, name: str, amount: int = 1):
+        counter = self._counters.get(group)
+        if counter is None:
+            counter = self._counters[group] = Counter()
+        counter[name] += amount
+
+
+    def count(self, group: str, name: str = None) -> int:
+        counter = self._counters.get(group)
+        if counter is None:
+            return 0
+        return counter.total() if name is None else counter[name]
+
+
+    def reject(self, reason: str):
+        self.increment('rejected', reason)
+
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = Histogram()
+        return histogram
+
+
+    def observe(self, stage: str, seconds: float):
+        self.histogram(stage).observe(seconds)
+
+
+    def summary(self) -> dict:
+        duration = time.time() - self._started
+        return {
+            'uptime_seconds': duration,
+            'counters': { group: dict(counter) for group, counter in self._counters.items() },
+            'rates_per_second': {
+                group: { name: count / duration for name, count in counter.items() }
+                for group, counter in self._counters.items()
+            } if duration > 0 else {},
+            'latencies': { stage: histogram.summary() for stage, histogram in self._histograms.items() }
+        }
+
+
+    # Saves the summary, or a summary that was extended by the caller.
+    def dump(self, path: Path, summary: dict = None):
+        if summary is None:
+            summary = self.summary()
+
+        with open(path, 'w') as file:
+            json.dump(summary, file, indent=4)
@@ -0,0 +1,169 @@
+import asyncio
+from enum import Enum, auto
+import queue
+import threading
+import time
+from typing import Callable
+
+from .metrics import Histogram
+
+
+class OverflowPolicy(Enum):
+    # Wait for room, which slows down the stage in front of the queue.
+    BLOCK = auto()
+    # Throw away the oldest queued item to make room for the new one.
+    DROP_OLDEST = auto()
+    # Throw away the new item.
+    DROP_NEWEST = auto()
+
+
+class QueueMetrics:
+    def __init__(self, name: str, max_size: int, policy: OverflowPolicy):
+        self.name = name
+        self.max_size = max_size
+        self.policy = policy
+        self.depth = 0
+        self.high_water_mark = 0
+        self.total = 0
+        self.dropped = 0
+
+
+    def record_put(self, depth: int):
+        self.total += 1
+        self.depth = depth
+        self.high_water_mark = max(self.high_water_mark, depth)
+
+
+    def summary(self) -> dict:
+        return {
+            'depth': self.depth,
+            'max_size': self.max_size,
+            'high_water_mark': self.high_water_mark,
+            'total': self.total,
+            'dropped': self.dropped,
+            'policy': self.policy.name.lower()
+        }
+
+
+# A bounded asyncio queue between two pipeline stages.
+class StageQueue:
+    def __init__(self, name: str, max_size: int, policy: OverflowPolicy = OverflowPolicy.BLOCK):
+        self._queue: asyncio.Queue = asyncio.Queue(max_size)
+        self._policy = policy
+        self.metrics = QueueMetrics(name, max_size, policy)
+
+
+    async def put(self, item):
+        if self._queue.full():
+            match self._policy:
+                case OverflowPolicy.DROP_NEWEST:
+                    self.metrics.dropped += 1
+                    return
+                case OverflowPolicy.DROP_OLDEST:
+                    self.metrics.dropped += 1
+                    self._queue.get_nowait()
+
+        await self._queue.put(item)
+        self.metrics.record_put(self._queue.qsize())
+
+
+    async def get(self):
+        item = await self._queue.get()
+        self.metrics.depth = self._queue.qsize()
+        return item
+
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+
+    def get_nowait(self):
+        item = self._queue.get_nowait()
+        self.metrics.depth = self._queue.qsize()
+        return item
+
+
+_STOP = object()
+
+
+# Runs blocking calls, like the file writes of Directory, in order on a
+# dedicated thread. Calls are queued with submit() and the idle callback runs
+# whenever nothing has been submitted for idle_interval seconds. The duration
+# of every call is recorded in the latency histogram if one is given.
+class Worker:
+    def __init__(self, name: str, max_size: int, policy: OverflowPolicy = OverflowPolicy.BLOCK,
+                 idle: Callable[[], None] = None, idle_interval: float = 1.0,
+                 close: Callable[[], None] = None, latency: Histogram = None):
+        self._queue: queue.Queue = queue.Queue(max_size)
+        self._policy = policy
+        self._idle = idle
+        self._idle_interval = idle_interval
+        self._close = close
+        self._latency = latency
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.metrics = QueueMetrics(name, max_size, policy)
+
+
+    def start(self):
+        self._thread.start()
+
+
+    async def submit(self, function: Callable, *arguments):
+        item = (function, arguments)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            match self._policy:
+                case OverflowPolicy.DROP_NEWEST:
+                    self.metrics.dropped += 1
+                    return
+                case OverflowPolicy.DROP_OLDEST:
+                    self.metrics.dropped += 1
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        pass
+                    self._queue.put_nowait(item)
+                case OverflowPolicy.BLOCK:
+                    # Wait on another thread so the event loop keeps running.
+                    await asyncio.to_thread(self._queue.put, item)
+
+        self.metrics.record_put(self._queue.qsize())
+
+
+    async def stop(self):
+        await asyncio.to_thread(self._queue.put, _STOP)
+        await asyncio.to_thread(self._thread.join)
+
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self._idle_interval)
+                except queue.Empty:
+                    if self._idle is not None:
+                        self._call(self._idle)
+                    continue
+
+                self.metrics.depth = self._queue.qsize()
+                if item is _STOP:
+                    return
+
+                function, arguments = item
+                started = time.perf_counter()
+                self._call(function, *arguments)
+                if self._latency is not None:
+                    self._latency.observe(time.perf_counter() - started)
+        finally:
+            if self._close is not None:
+                self._close()
+
+
+    # A failing call, for example a write to a full disk, must not end the
+    # thread, since submit() and stop() would then wait for it forever.
+    def _call(self, function: Callable, *arguments):
+        try:
+            function(*arguments)
+        except Exception as error:
+            print(f'[ERROR] {self.metrics.name} failed: {error!r}')
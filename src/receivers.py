@@ -0,0 +1,55 @@
+from collections import Counter
+
+from serial import Serial
+
+from .metrics import Metrics
+from .relay import Relay
+from .serial_reader import SerialReader
+
+
+# One ground receiver: its serial port, the thread reading it and the relay
+# decoding its bytes.
+class Receiver:
+    def __init__(self, name: str, serial: Serial, max_queue_size: int, metrics: Metrics, require_checksum: bool = False):
+        self.name = name
+        self.serial = serial
+        self.reader = SerialReader(serial, max_queue_size, name=f'serial {name}')
+        self.relay = Relay(metrics, require_checksum)
+
+
+# How much each ground receiver contributes when several receive the same
+# CanSat. The first good copy of a frame is kept and the copies from the other
+# receivers are dropped as duplicates. A receiver's loss is the fraction of
+# the kept frames it did not deliver itself.
+class ReceiverStatistics:
+    def __init__(self, names: list[str]):
+        self._names = names
+        self._first = Counter()
+        self._duplicates = Counter()
+
+
+    @property
+    def multiple(self):
+        return len(self._names) > 1
+
+
+    def add_first(self, name: str):
+        self._first[name] += 1
+
+
+    def add_duplicate(self, name: str):
+        self._duplicates[name] += 1
+
+
+    def summary(self) -> dict:
+        unique = self._first.total()
+        return {
+            name: {
+                'first': self._first[name],
+                'duplicates': self._duplicates[name],
+                # The share of the kept frames that came from this receiver first.
+                'contribution': self._first[name] / unique if unique else 0.0,
+                'loss': 1 - (self._first[name] + self._duplicates[name]) / unique if unique else 0.0
+            }
+            for name in self._names
+        }
@@ -1,127 +1,256 @@
-from enum import Enum, IntEnum, auto
+from binascii import crc_hqx
+from enum import IntEnum
+from struct import Struct
 import time
 
-from serial import Serial
+import numpy as np
 
-from .data import Data, DropData, dataSize, dropDataSize, deserializeData, deserializeDropData
+from .data import (
+    Data, DropData, dataSize, dropDataSize, deserializeData, deserializeDropData,
+    deserializeDataBatch, deserializeDropDataBatch
+)
+from .metrics import Metrics
+from .uplink import Acknowledgement, acknowledgementSize, deserializeAcknowledgement
 
 _DATA_TIMEOUT_SECONDS = 0.1
 _TEXT_TIMEOUT_SECONDS = 1
 _HEADER_BYTES = b'01'
-
-
-class ReceiveState(Enum):
-    HEADER = auto()
-    TYPE = auto()
-    DATA = auto()
-    DROP = auto()
-    TEXT = auto()
+_TEXT_END = b'\n'
+# CRC-16/CCITT-FALSE of the type byte and the payload, sent after the payload.
+_CRC = Struct('<H')
+_CRC_INITIAL = 0xFFFF
 
 
 class MessageType(IntEnum):
     DATA = ord('0')
     DROP = ord('1')
     TEXT = ord('2')
+    # DATA and DROP frames followed by a checksum, see _CRC.
+    CHECKED_DATA = ord('3')
+    CHECKED_DROP = ord('4')
+    # The ground station's report of a command sent to the CanSat, always
+    # followed by a checksum.
+    ACK = ord('5')
+
+
+# The decoded type and payload size of every type followed by a checksum.
+_CHECKED_TYPES = {
+    MessageType.CHECKED_DATA: (MessageType.DATA, dataSize),
+    MessageType.CHECKED_DROP: (MessageType.DROP, dropDataSize),
+    MessageType.ACK: (MessageType.ACK, acknowledgementSize)
+}
+
+
+# The checksum of a checked frame, computed over its type byte and payload.
+def frame_checksum(type_and_payload) -> int:
+    return crc_hqx(type_and_payload, _CRC_INITIAL)
+
+
+def checked_frame(message_type: MessageType, payload: bytes) -> bytes:
+    type_and_payload = bytes([message_type]) + payload
+    return _HEADER_BYTES + type_and_payload + _CRC.pack(frame_checksum(type_and_payload))
 
 
+# A single bit error turns the type byte of a checked frame into the one of an
+# unchecked frame, which would skip the checksum. So once a checked DATA or
+# DROP frame has been received, or from the start with require_checksum,
+# unchecked DATA and DROP frames are rejected.
 class Relay:
-    def __init__(self, serial: Serial):
-        self._serial = serial
+    def __init__(self, metrics: Metrics = None, require_checksum: bool = False):
+        self._buffer = bytearray()
+        self._require_checksum = require_checksum
+        # When the frame at the start of the buffer was first seen incomplete.
+        self._pending_since: float = None
+        # Counts decoded frames, rejected headers and discarded bytes.
+        self.metrics = metrics if metrics is not None else Metrics()
+
+
+    def feed(self, received: bytes):
+        self._buffer += received
+
+
+    def receive(self) -> list[Data | DropData | Acknowledgement | str]:
+        frames, consumed = self._read_frames()
+
+        messages = []
+        with memoryview(self._buffer) as view:
+            for message_type, start, end in frames:
+                match message_type:
+                    case MessageType.DATA:
+                        messages.append(deserializeData(view[start:end]))
+                    case MessageType.DROP:
+                        messages.append(deserializeDropData(view[start:end]))
+                    case MessageType.TEXT:
+                        messages.append(bytes(view[start:end]).decode('latin-1'))
+                    case MessageType.ACK:
+                        messages.append(deserializeAcknowledgement(view[start:end]))
+
+        del self._buffer[:consumed]
+        return messages
+
+
+    # Decodes DATA and DROP frames into structured arrays, see
+    # deserializeDataBatch and deserializeDropDataBatch. Acknowledgements are
+    # skipped.
+    def receive_batch(self) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        frames, consumed = self._read_frames()
 
-        self._header_index = 0
-        self._start_time: float
-        self._receive_state = ReceiveState.HEADER
-        self._incoming_text = ''
+        payloads = { MessageType.DATA: bytearray(), MessageType.DROP: bytearray() }
+        texts = []
+        with memoryview(self._buffer) as view:
+            for message_type, start, end in frames:
+                if message_type == MessageType.TEXT:
+                    texts.append(bytes(view[start:end]).decode('latin-1'))
+                elif message_type != MessageType.ACK:
+                    payloads[message_type] += view[start:end]
 
+        del self._buffer[:consumed]
+        return (
+            deserializeDataBatch(payloads[MessageType.DATA]),
+            deserializeDropDataBatch(payloads[MessageType.DROP]),
+            texts
+        )
 
-    @property
-    def receive_state(self):
-        return self._receive_state
 
+    # Finds the complete frames among the fed bytes. The consumed bytes must be
+    # removed from the buffer by the caller once the payloads have been decoded.
+    def _read_frames(self) -> tuple[list[tuple[MessageType, int, int]], int]:
+        if not self._buffer:
+            return [], 0
 
-    def _timeout(self, max_duration: float):
-        if time.perf_counter() - self._start_time > max_duration:
-            self._receive_state = ReceiveState.HEADER
+        return self._decode()
+
+
+    def _timeout(self, max_duration: float) -> bool:
+        now = time.perf_counter()
+        if self._pending_since is None:
+            self._pending_since = now
+            return False
+        elif now - self._pending_since > max_duration:
+            self._pending_since = None
             print('Timeout reached')
+            self.metrics.reject('timeout')
             return True
         else:
             return False
 
 
-    def try_receive_header(self):
-        if self._serial.in_waiting == 0:
-            return
-        
-        byte = self._serial.read()[0]
+    # Finds every complete frame in the buffer. Returns the type and payload
+    # offsets of each frame, and the number of bytes that can be dropped from
+    # the start of the buffer.
+    def _decode(self) -> tuple[list[tuple[MessageType, int, int]], int]:
+        buffer = self._buffer
+        size = len(buffer)
+        frames = []
+        position = 0
 
-        if byte == _HEADER_BYTES[self._header_index]:
-            self._header_index += 1
-            if self._header_index == len(_HEADER_BYTES):
-                self._receive_state = ReceiveState.TYPE
-                self._header_index = 0
-        else:
-            self._header_index = 0
-            print(f"Incorrect start byte: '{chr(byte)}' = {byte}.")
-
-
-    def try_receive_type(self):
-        if self._serial.in_waiting == 0:
-            return
-        
-        byte = self._serial.read()[0]
-
-        match byte:
-            case MessageType.DATA:
-                self._receive_state = ReceiveState.DATA
-            case MessageType.DROP:
-                self._receive_state = ReceiveState.DROP
-            case MessageType.TEXT:
-                self._receive_state = ReceiveState.TEXT
-                self._incoming_text = ''
-            case _:
-                self._receive_state = ReceiveState.HEADER
-                print('Incorrect message type.')
-                return
-
-        self._start_time = time.perf_counter()
-
-
-    def try_receive_data(self) -> Data | None:
-        if self._timeout(_DATA_TIMEOUT_SECONDS):
-            return None
-
-        if self._serial.in_waiting >= dataSize:
-            serialized = self._serial.read(dataSize)
-            data = deserializeData(serialized)
-            self._receive_state = ReceiveState.HEADER
-            return data
-        else:
-            return None
+        while True:
+            start = buffer.find(_HEADER_BYTES, position)
 
+            if start < 0:
+                # Keep a trailing byte that could be the start of a header.
+                end = size - 1 if buffer.endswith(_HEADER_BYTES[:1]) else size
+                self._discard(end - position)
+                return frames, max(position, end)
 
-    def try_receive_drop_data(self) -> DropData | None:
-        if self._timeout(_DATA_TIMEOUT_SECONDS):
-            return None
+            self._discard(start - position)
 
-        if self._serial.in_waiting >= dropDataSize:
-            serialized = self._serial.read(dropDataSize)
-            data = deserializeDropData(serialized)
-            self._receive_state = ReceiveState.HEADER
-            return data
-        else:
-            return None
+            type_index = start + len(_HEADER_BYTES)
+            if type_index >= size:
+                return frames, start
 
+            body = type_index + 1
+            message_type = buffer[type_index]
+            if self._require_checksum and message_type in (MessageType.DATA, MessageType.DROP):
+                print('Unchecked frame rejected.')
+                self.metrics.reject('unchecked')
+                position = start + 1
+                continue
 
-    def try_receive_text(self) -> str | None:
-        if self._timeout(_TEXT_TIMEOUT_SECONDS):
-            return None
+            match message_type:
+                case MessageType.DATA:
+                    end = body + dataSize
+                    payload_end = end
+                    timeout = _DATA_TIMEOUT_SECONDS
+                case MessageType.DROP:
+                    end = body + dropDataSize
+                    payload_end = end
+                    timeout = _DATA_TIMEOUT_SECONDS
+                case MessageType.TEXT:
+                    newline = buffer.find(_TEXT_END, body)
+                    end = size + 1 if newline < 0 else newline + 1
+                    payload_end = newline
+                    timeout = _TEXT_TIMEOUT_SECONDS
+                case MessageType.CHECKED_DATA | MessageType.CHECKED_DROP | MessageType.ACK:
+                    payload_end = body + _CHECKED_TYPES[message_type][1]
+                    end = payload_end + _CRC.size
+                    timeout = _DATA_TIMEOUT_SECONDS
+                case _:
+                    print('Incorrect message type.')
+                    self.metrics.reject('message_type')
+                    position = start + 1
+                    continue
 
-        if self._serial.in_waiting > 0:
-            byte = self._serial.read()[0]
-            character = chr(byte)
-            if character == '\n':
-                self._receive_state = ReceiveState.HEADER
-                return self._incoming_text
+            if end <= size:
+                if message_type in _CHECKED_TYPES:
+                    if not self._checksum_matches(type_index, payload_end):
+                        # Either the frame was corrupted or the header was
+                        # part of other bytes. Resync at the next header
+                        # candidate right away.
+                        print('Incorrect checksum.')
+                        self.metrics.reject('checksum')
+                        position = start + 1
+                        continue
+                    if message_type != MessageType.ACK:
+                        self._require_checksum = True
+                    message_type = _CHECKED_TYPES[message_type][0]
+
+                message_type = MessageType(message_type)
+                frames.append((message_type, body, payload_end))
+                self.metrics.increment('decoded', message_type.name.lower())
+                self._pending_since = None
+                position = end
+            elif self._has_checked_frame(start + 1):
+                # A complete checked frame starts inside this one, so this
+                # header was not real or the frame lost bytes. There is no
+                # need to wait for the timeout.
+                print('Incomplete frame skipped.')
+                self.metrics.reject('truncated')
+                self._pending_since = None
+                position = start + 1
+            elif self._timeout(timeout):
+                # Give up on this header and look for the next one inside the
+                # bytes that have already arrived.
+                position = start + 1
             else:
-                self._incoming_text += character
-        return None
+                return frames, start
+
+
+    def _checksum_matches(self, type_index: int, payload_end: int) -> bool:
+        received, = _CRC.unpack_from(self._buffer, payload_end)
+        return frame_checksum(self._buffer[type_index:payload_end]) == received
+
+
+    def _has_checked_frame(self, position: int) -> bool:
+        buffer = self._buffer
+        size = len(buffer)
+
+        while True:
+            start = buffer.find(_HEADER_BYTES, position)
+            type_index = start + len(_HEADER_BYTES)
+            if start < 0 or type_index >= size:
+                return False
+
+            checked_type = _CHECKED_TYPES.get(buffer[type_index])
+            if checked_type is not None:
+                payload_end = type_index + 1 + checked_type[1]
+                if payload_end + _CRC.size <= size and self._checksum_matches(type_index, payload_end):
+                    return True
+
+            position = start + 1
+
+
+    def _discard(self, count: int):
+        if count > 0:
+            print(f'Incorrect start bytes: {count} bytes discarded.')
+            self.metrics.increment('discarded', 'bytes', count)
@@ -0,0 +1,105 @@
+from collections import deque
+import heapq
+from itertools import count
+
+
+# Holds frames for a short while and releases them sorted by CanSat time, so
+# frames the radio delivered out of order are written and shown in order.
+# Frames are released once any held frame has waited hold seconds, or once a
+# frame more than hold seconds newer in CanSat time has arrived, so no frame
+# is held longer than hold. Frames arriving after a newer frame was already
+# released cannot be put back in order and are discarded, unless hold is 0
+# and frames are passed on as they arrive. Callers check admit() before
+# counting a frame as received anywhere else.
+class ReorderBuffer:
+    def __init__(self, hold: float):
+        self._hold = hold
+        self._hold_milliseconds = hold * 1000
+        # (CanSat time, arrival order, item)
+        self._heap: list[tuple[int, int, object]] = []
+        self._order = count()
+        # (arrival order, arrival time) of the held frames in arrival order,
+        # released ones are removed lazily from the front.
+        self._arrivals: deque[tuple[int, float]] = deque()
+        self._released_orders: set[int] = set()
+        self._newest: int = None
+        self._released: int = None
+
+        # Frames that arrived after a newer one and were put back in order.
+        self.late = 0
+        self.discarded = 0
+
+
+    def __len__(self):
+        return len(self._heap)
+
+
+    # Whether a frame with this time can still be put in order. Frames that
+    # cannot are counted as discarded.
+    def admit(self, time: int) -> bool:
+        if self._hold > 0 and self._released is not None and time < self._released:
+            self.discarded += 1
+            return False
+        return True
+
+
+    def add(self, time: int, item, now: float) -> bool:
+        if not self.admit(time):
+            return False
+
+        if self._newest is None or time > self._newest:
+            self._newest = time
+        elif time < self._newest:
+            self.late += 1
+
+        order = next(self._order)
+        heapq.heappush(self._heap, (time, order, item))
+        self._arrivals.append((order, now))
+        return True
+
+
+    # The arrival time of the frame held the longest.
+    def _oldest_arrival(self) -> float:
+        arrivals = self._arrivals
+        while arrivals[0][0] in self._released_orders:
+            self._released_orders.remove(arrivals.popleft()[0])
+        return arrivals[0][1]
+
+
+    def _pop(self):
+        time, order, item = heapq.heappop(self._heap)
+        self._released = time
+        self._released_orders.add(order)
+        return item
+
+
+    # The items that are due at now, a perf_counter() time, oldest first.
+    def release(self, now: float) -> list:
+        released = []
+        heap = self._heap
+        while heap:
+            if now - self._oldest_arrival() < self._hold and self._newest - heap[0][0] < self._hold_milliseconds:
+                break
+            released.append(self._pop())
+
+        if not heap:
+            self._arrivals.clear()
+            self._released_orders.clear()
+        return released
+
+
+    # Releases every item, for example when the session ends.
+    def drain(self) -> list:
+        released = [self._pop() for _ in range(len(self._heap))]
+        self._arrivals.clear()
+        self._released_orders.clear()
+        return released
+
+
+    def summary(self) -> dict:
+        return {
+            'depth': len(self._heap),
+            'hold_ms': self._hold_milliseconds,
+            'late': self.late,
+            'discarded': self.discarded
+        }
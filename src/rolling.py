@@ -0,0 +1,154 @@
+from collections import deque
+from dataclasses import dataclass
+import math
+
+from .data import Data, DropData, componentNames, componentValues
+
+
+@dataclass(slots=True)
+class Anomaly:
+    time: int
+    channel: str
+    value: float
+    mean: float
+    deviation: float
+    score: float
+
+
+# Statistics over the last window values of one channel. Every update is O(1):
+# the mean and variance use Welford's method with the value leaving the window
+# removed again, and the minimum and maximum use monotonic deques.
+class RollingChannel:
+    def __init__(self, window: int):
+        self._window = window
+        self._values: deque[float] = deque()
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+        # (index, value) pairs where the values are increasing and decreasing.
+        self._minimums: deque[tuple[int, float]] = deque()
+        self._maximums: deque[tuple[int, float]] = deque()
+        self._index = 0
+
+        self._last: tuple[int, float] = None
+        self.rate_of_change = 0.0
+
+
+    @property
+    def count(self):
+        return self._count
+
+
+    @property
+    def mean(self):
+        return self._mean
+
+
+    @property
+    def deviation(self):
+        if self._count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self._count - 1))
+
+
+    @property
+    def minimum(self):
+        return self._minimums[0][1] if self._minimums else None
+
+
+    @property
+    def maximum(self):
+        return self._maximums[0][1] if self._maximums else None
+
+
+    # The number of standard deviations the value is from the mean, measured
+    # before the value itself is added.
+    def score(self, value: float) -> float:
+        deviation = self.deviation
+        if deviation == 0:
+            return 0.0
+        return abs(value - self._mean) / deviation
+
+
+    def add(self, time: int, value: float):
+        self._values.append(value)
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+
+        if self._count > self._window:
+            removed = self._values.popleft()
+            self._count -= 1
+            delta = removed - self._mean
+            self._mean -= delta / self._count
+            self._m2 = max(0.0, self._m2 - delta * (removed - self._mean))
+
+        oldest_index = self._index - self._window + 1
+        while self._minimums and self._minimums[-1][1] >= value:
+            self._minimums.pop()
+        self._minimums.append((self._index, value))
+        while self._minimums[0][0] < oldest_index:
+            self._minimums.popleft()
+
+        while self._maximums and self._maximums[-1][1] <= value:
+            self._maximums.pop()
+        self._maximums.append((self._index, value))
+        while self._maximums[0][0] < oldest_index:
+            self._maximums.popleft()
+
+        self._index += 1
+
+        if self._last is not None and time != self._last[0]:
+            last_time, last_value = self._last
+            # Per second, since the CanSat time is in milliseconds.
+            self.rate_of_change = (value - last_value) / (time - last_time) * 1000
+        self._last = (time, value)
+
+
+    def summary(self) -> dict:
+        return {
+            'mean': self._mean,
+            'deviation': self.deviation,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'rate_of_change': self.rate_of_change
+        }
+
+
+# Keeps rolling statistics for every channel and flags values that are more
+# than threshold standard deviations from the recent mean.
+class RollingStatistics:
+    def __init__(self, window: int = 200, threshold: float = 4.0, min_count: int = 20):
+        self._threshold = threshold
+        self._min_count = min_count
+        self._channels = { name: RollingChannel(window) for name in componentNames }
+        self.anomaly_count = 0
+
+
+    def update(self, data: Data | DropData) -> list[Anomaly]:
+        anomalies = []
+
+        for name, value in zip(componentNames, componentValues(data)):
+            if value is None:
+                continue
+
+            channel = self._channels[name]
+            if channel.count >= self._min_count:
+                score = channel.score(value)
+                if score > self._threshold:
+                    anomalies.append(Anomaly(data.time, name, value, channel.mean, channel.deviation, score))
+
+            channel.add(data.time, value)
+
+        self.anomaly_count += len(anomalies)
+        return anomalies
+
+
+    def summary(self) -> dict:
+        return {
+            name: channel.summary()
+            for name, channel in self._channels.items()
+            if channel.count > 0
+        }
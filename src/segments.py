@@ -0,0 +1,146 @@
+from concurrent.futures import Executor
+from dataclasses import dataclass
+import gzip
+import os
+from pathlib import Path
+import re
+import shutil
+import time
+
+from .writer import ChannelWriter
+
+# A segmented channel is a series of CSV files that each start with the header:
+#   acceleration.0000.csv.gz, acceleration.0001.csv.gz, ..., acceleration.0042.csv
+# Only the segment being written is uncompressed. Sessions recorded before
+# segments existed have a single acceleration.csv, which is read the same way.
+COMPRESSED_SUFFIX = '.gz'
+_SEGMENT_PATTERN = r'^{channel}(?:\.(\d+))?\.csv(\.gz)?$'
+
+
+@dataclass
+class SegmentPolicy:
+    # Start a new segment after this many rows.
+    max_rows: int = 100000
+    # Start a new segment when the current one is older than this.
+    max_seconds: float = 600.0
+    # The gzip level of finished segments, 0 leaves them uncompressed.
+    compression_level: int = 6
+
+
+def segment_path(directory: Path, channel: str, index: int) -> Path:
+    return Path(directory, f'{channel}.{index:04d}.csv')
+
+
+# Replaces a finished segment with its compressed copy. The copy only gets its
+# final name once it is complete, so a crash leaves at least one of the two.
+def compress_segment(path: Path, level: int = 6):
+    compressed = path.with_name(path.name + COMPRESSED_SUFFIX)
+    temporary = path.with_name(path.name + COMPRESSED_SUFFIX + '.tmp')
+    try:
+        with path.open('rb') as source, temporary.open('wb') as file:
+            with gzip.GzipFile(filename=path.name, mode='wb', compresslevel=level, fileobj=file) as destination:
+                shutil.copyfileobj(source, destination, 1024 * 1024)
+            file.flush()
+            os.fsync(file.fileno())
+        temporary.replace(compressed)
+        path.unlink()
+    except OSError as error:
+        print(f'[ERROR] Compressing {path} failed: {error}')
+        temporary.unlink(missing_ok=True)
+
+
+# Writes a channel as rotated segments. Finished segments are compressed by
+# the executor so the writing thread does not wait for it.
+class SegmentedChannelWriter:
+    def __init__(self, directory: Path, channel: str, fieldnames: list[str],
+                 policy: SegmentPolicy, executor: Executor):
+        self._directory = directory
+        self._channel = channel
+        self._fieldnames = fieldnames
+        self._policy = policy
+        self._executor = executor
+
+        self._index = 0
+        self._open_segment()
+
+
+    def write(self, row: tuple):
+        self._writer.write(row)
+        self._rows += 1
+
+
+    def flush(self):
+        self._writer.flush()
+        if self._rows >= self._policy.max_rows or time.monotonic() - self._started >= self._policy.max_seconds:
+            self._rotate()
+
+
+    def sync(self):
+        self._writer.sync()
+
+
+    # The last segment is compressed too, the caller waits for the executor.
+    def close(self):
+        self._writer.close()
+        self._compress()
+
+
+    def _open_segment(self):
+        self._path = segment_path(self._directory, self._channel, self._index)
+        self._writer = ChannelWriter(self._path, self._fieldnames)
+        self._rows = 0
+        self._started = time.monotonic()
+
+
+    def _rotate(self):
+        self._writer.close()
+        self._compress()
+
+        self._index += 1
+        self._open_segment()
+
+
+    def _compress(self):
+        if self._policy.compression_level > 0:
+            self._executor.submit(compress_segment, self._path, self._policy.compression_level)
+
+
+# The segments of a channel in order. A segment that exists both compressed
+# and uncompressed was being compressed and both copies are complete.
+def channel_segments(directory: Path, channel: str) -> list[Path]:
+    pattern = re.compile(_SEGMENT_PATTERN.format(channel=re.escape(channel)))
+    segments: dict[int, Path] = {}
+    for path in Path(directory).iterdir():
+        match = pattern.match(path.name)
+        if match is None:
+            continue
+
+        index = int(match[1]) if match[1] is not None else -1
+        if index not in segments or not match[2]:
+            segments[index] = path
+
+    return [segments[index] for index in sorted(segments)]
+
+
+def has_channel(directory: Path, channel: str) -> bool:
+    return Path(directory).is_dir() and bool(channel_segments(directory, channel))
+
+
+# Yields the data lines of every segment of a channel, without the headers,
+# reading one segment at a time.
+def read_channel_lines(directory: Path, channel: str):
+    for path in channel_segments(directory, channel):
+        with _open_segment(path) as file:
+            next(file, None)
+            yield from file
+
+
+def _open_segment(path: Path):
+    if path.suffix == COMPRESSED_SUFFIX:
+        return gzip.open(path, 'rt', newline='')
+
+    try:
+        return path.open('r', newline='')
+    except FileNotFoundError:
+        # It was compressed since the segments were listed.
+        return gzip.open(path.with_name(path.name + COMPRESSED_SUFFIX), 'rt', newline='')
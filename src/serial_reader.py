@@ -0,0 +1,88 @@
+import asyncio
+from concurrent.futures import CancelledError
+import threading
+
+from serial import Serial, SerialException
+
+from .pipeline import OverflowPolicy, StageQueue
+
+# How long a blocking read may wait for the first byte. This bounds how long it
+# takes the reader thread to notice that it should stop.
+READ_TIMEOUT_SECONDS = 0.1
+
+
+# Reads the serial port on a dedicated thread and hands the received bytes to
+# the event loop, so the loop only wakes up when something has arrived. When
+# the queue is full the thread stops reading and the bytes wait in the serial
+# driver instead.
+class SerialReader:
+    def __init__(self, serial: Serial, max_queue_size: int = 256, name: str = 'serial'):
+        self._serial = serial
+        self._name = name
+        self._queue = StageQueue(name, max_queue_size, OverflowPolicy.BLOCK)
+
+        self._loop: asyncio.AbstractEventLoop = None
+        self._thread: threading.Thread = None
+        self._running = threading.Event()
+
+
+    @property
+    def metrics(self):
+        return self._queue.metrics
+
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=f'{self._name} reader', daemon=True)
+        self._thread.start()
+
+
+    async def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+
+
+    # Waits for received bytes. Returns an empty bytes object if nothing
+    # arrived within the timeout.
+    async def read(self, timeout: float = None) -> bytes:
+        try:
+            received = await asyncio.wait_for(self._queue.get(), timeout)
+        except TimeoutError:
+            return b''
+
+        # Merge everything else that has already arrived.
+        while not self._queue.empty():
+            received += self._queue.get_nowait()
+
+        return received
+
+
+    def _run(self):
+        while self._running.is_set():
+            try:
+                # Blocks until at least one byte arrives or the port times out.
+                received = self._serial.read(self._serial.in_waiting or 1)
+            except SerialException as error:
+                print(f'[ERROR] Reading from {self._name} failed: {error}')
+                self._running.clear()
+                return
+
+            if received:
+                self._hand_over(received)
+
+
+    def _hand_over(self, received: bytes):
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(received), self._loop)
+        while self._running.is_set():
+            try:
+                future.result(timeout=READ_TIMEOUT_SECONDS)
+                return
+            except TimeoutError:
+                continue
+            except CancelledError:
+                # The event loop is shutting down.
+                self._running.clear()
+                return
+        future.cancel()
@@ -0,0 +1,155 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .flight_log import DATA_FIELDS, DATA_LOG_NAME, DROP_LOG_NAME, read_flight_log
+
+INDEX_NAME = 'time_index.npz'
+
+# The logs of a session, in the order of the source numbers in the index.
+_LOG_NAMES = [DATA_LOG_NAME, DROP_LOG_NAME]
+_WINDOW_DTYPE = np.dtype(DATA_FIELDS)
+
+
+# A time index over the flight logs of a session. The times of both logs are
+# kept sorted together with the log and row each one comes from, so finding
+# the samples in a time range is a binary search and the result merges every
+# channel into one array, with NaN for channels a sample does not have.
+#
+# The index is built on first use and saved next to the logs. When the logs
+# have grown, for example while the session is still being recorded, only the
+# new rows are added.
+class SessionIndex:
+    def __init__(self, path: Path):
+        self._path = Path(path)
+        self._logs: list[np.ndarray] = [None] * len(_LOG_NAMES)
+        self._counts = np.zeros(len(_LOG_NAMES), dtype=np.int64)
+        self._times = np.zeros(0, dtype=np.int64)
+        self._sources = np.zeros(0, dtype=np.int8)
+        self._rows = np.zeros(0, dtype=np.int64)
+
+        self._load()
+        self.refresh()
+
+
+    @property
+    def first(self):
+        return int(self._times[0]) if len(self._times) else None
+
+
+    @property
+    def last(self):
+        return int(self._times[-1]) if len(self._times) else None
+
+
+    def __len__(self):
+        return len(self._times)
+
+
+    # The position of the first sample at or after time.
+    def seek(self, time: int) -> int:
+        return int(np.searchsorted(self._times, time, side='left'))
+
+
+    # The samples with start <= time < end, sorted by time.
+    def window(self, start: int, end: int) -> np.ndarray:
+        first = self.seek(start)
+        last = self.seek(end)
+
+        window = np.empty(last - first, dtype=_WINDOW_DTYPE)
+        for name in _WINDOW_DTYPE.names[1:]:
+            window[name] = np.nan
+        window['time'] = self._times[first:last]
+
+        sources = self._sources[first:last]
+        rows = self._rows[first:last]
+        for source, log in enumerate(self._logs):
+            selected = sources == source
+            if log is None or not selected.any():
+                continue
+            records = log[rows[selected]]
+            for name in log.dtype.names:
+                window[name][selected] = records[name]
+
+        return window
+
+
+    # Adds the rows written to the logs since the index was built.
+    def refresh(self) -> bool:
+        added_times = []
+        added_sources = []
+        added_rows = []
+
+        for source, name in enumerate(_LOG_NAMES):
+            path = self._path / name
+            if not path.exists():
+                continue
+
+            log = read_flight_log(path)
+            self._logs[source] = log
+            count = len(log)
+            if count <= self._counts[source]:
+                continue
+
+            added_times.append(np.asarray(log['time'][self._counts[source]:]))
+            added_sources.append(np.full(count - self._counts[source], source, dtype=np.int8))
+            added_rows.append(np.arange(self._counts[source], count))
+            self._counts[source] = count
+
+        if not added_times:
+            return False
+
+        times = np.concatenate(added_times)
+        sources = np.concatenate(added_sources)
+        rows = np.concatenate(added_rows)
+        order = np.argsort(times, kind='stable')
+        times, sources, rows = times[order], sources[order], rows[order]
+
+        if len(self._times) and times[0] < self._times[-1]:
+            # Some new rows belong between the indexed ones.
+            times = np.concatenate([self._times, times])
+            sources = np.concatenate([self._sources, sources])
+            rows = np.concatenate([self._rows, rows])
+            order = np.argsort(times, kind='stable')
+            self._times, self._sources, self._rows = times[order], sources[order], rows[order]
+        else:
+            self._times = np.concatenate([self._times, times])
+            self._sources = np.concatenate([self._sources, sources])
+            self._rows = np.concatenate([self._rows, rows])
+
+        self._save()
+        return True
+
+
+    def _load(self):
+        path = self._path / INDEX_NAME
+        if not path.exists():
+            return
+
+        try:
+            with np.load(path) as index:
+                counts = index['counts']
+                # A log that shrank means the index belongs to other logs.
+                for source, name in enumerate(_LOG_NAMES):
+                    log_path = self._path / name
+                    if counts[source] > 0 and (not log_path.exists() or len(read_flight_log(log_path)) < counts[source]):
+                        return
+
+                self._counts = counts
+                self._times = index['times']
+                self._sources = index['sources']
+                self._rows = index['rows']
+        except (OSError, KeyError, ValueError) as error:
+            print(f'[ERROR] Ignoring the time index of {self._path}: {error}')
+
+
+    def _save(self):
+        path = self._path / INDEX_NAME
+        temporary = path.with_suffix('.tmp.npz')
+        try:
+            np.savez(temporary, counts=self._counts, times=self._times, sources=self._sources, rows=self._rows)
+            os.replace(temporary, path)
+        except OSError as error:
+            # The index still works from memory.
+            print(f'[ERROR] Could not save the time index of {self._path}: {error}')
@@ -0,0 +1,53 @@
+from collections import deque
+
+
+# Remembers the timestamps received during the last window milliseconds so
+# duplicates can be found in constant time and memory. Timestamps are
+# forgotten in arrival order once they fall out of the window behind the
+# latest timestamp.
+class TimestampWindow:
+    def __init__(self, window: int):
+        self._window = window
+        self._seen: set[int] = set()
+        self._arrival_order: deque[int] = deque()
+
+        self._first: int = None
+        self._latest: int = None
+
+
+    @property
+    def first(self):
+        return self._first
+
+
+    @property
+    def latest(self):
+        return self._latest
+
+
+    def __contains__(self, timestamp: int):
+        return timestamp in self._seen
+
+
+    def __len__(self):
+        return len(self._seen)
+
+
+    # Timestamps this far behind the latest one can no longer be checked for
+    # duplicates.
+    def is_expired(self, timestamp: int) -> bool:
+        return self._latest is not None and timestamp < self._latest - self._window
+
+
+    def add(self, timestamp: int):
+        self._seen.add(timestamp)
+        self._arrival_order.append(timestamp)
+
+        if self._first is None:
+            self._first = timestamp
+        if self._latest is None or timestamp > self._latest:
+            self._latest = timestamp
+
+        oldest_allowed = self._latest - self._window
+        while self._arrival_order and self._arrival_order[0] < oldest_allowed:
+            self._seen.discard(self._arrival_order.popleft())
@@ -0,0 +1,165 @@
+import asyncio
+from dataclasses import dataclass
+from enum import Enum
+import time
+from typing import Callable
+
+from serial import Serial
+
+from .metrics import Metrics
+from .pipeline import OverflowPolicy, StageQueue, Worker
+
+_HEADER_BYTES = b'01'
+# The ground station Arduino only reports the timeout of a command it
+# received incompletely as text.
+_INCOMPLETE_COMMAND = 'Arduino timeout'
+
+# action (u1) | value (u1) | whether the CanSat acknowledged the radio packet (u1)
+# followed by the checksum of checked frames, see relay.checked_frame.
+acknowledgementSize = 3
+
+
+# The ground station Arduino's report of a command it transmitted to the CanSat.
+@dataclass(slots=True)
+class Acknowledgement:
+    action: int
+    value: int
+    delivered: bool
+
+
+def deserializeAcknowledgement(data) -> Acknowledgement:
+    return Acknowledgement(action=data[0], value=data[1], delivered=bool(data[2]))
+
+
+class CommandStatus(Enum):
+    # The CanSat acknowledged the command.
+    ACKNOWLEDGED = 'acknowledged'
+    # The ground station could not reach the CanSat on any attempt.
+    FAILED = 'failed'
+    # Nothing answered, for example during a replay or with older firmware.
+    UNCONFIRMED = 'unconfirmed'
+
+
+@dataclass(slots=True)
+class Command:
+    name: str
+    action: int
+    value: int
+    queued: float
+    attempts: int = 0
+
+
+# Sends commands to the CanSat one at a time through the ground station
+# Arduino. The serial writes happen on a worker thread so a full serial buffer
+# never blocks the event loop. Every command waits up to timeout seconds for
+# its acknowledgement and is sent again up to retries times. on_result is
+# called with the command, its status and the round trip in seconds.
+class Uplink:
+    def __init__(self, serial: Serial, metrics: Metrics, on_result: Callable[[Command, CommandStatus, float | None], None],
+                 timeout: float = 0.5, retries: int = 3, max_queue_size: int = 32):
+        self._serial = serial
+        self._metrics = metrics
+        self._on_result = on_result
+        self._timeout = timeout
+        self._retries = retries
+
+        self._queue = StageQueue('uplink', max_queue_size, OverflowPolicy.BLOCK)
+        self._writer = Worker('uplink writes', max_queue_size, OverflowPolicy.BLOCK)
+        self._pending: Command = None
+        # Set to (delivered, received time) by the response to the pending command.
+        self._response: asyncio.Future = None
+
+
+    @property
+    def queues(self):
+        return [self._queue.metrics, self._writer.metrics]
+
+
+    def start(self):
+        self._writer.start()
+
+
+    async def stop(self):
+        await self._writer.stop()
+
+
+    async def send(self, name: str, action: int, value: int):
+        if not 0 <= value <= 255:
+            print(f'[ERROR] Invalid value for {name}: {value}')
+            return
+        await self._queue.put(Command(name, action, value, time.perf_counter()))
+
+
+    # Called with every acknowledgement the ground station sends, received is
+    # when it was read from the serial port.
+    def acknowledge(self, acknowledgement: Acknowledgement, received: float):
+        command = self._pending
+        if command is None or (acknowledgement.action, acknowledgement.value) != (command.action, command.value):
+            print(f'[WARNING] Unexpected acknowledgement of command {acknowledgement.action}:{acknowledgement.value}.')
+            self._metrics.increment('commands', 'unexpected_acknowledgements')
+            return
+
+        self._respond(acknowledgement.delivered, received)
+
+
+    # Called with every text message of the ground station.
+    def text(self, message: str, received: float):
+        if self._pending is not None and message.strip() == _INCOMPLETE_COMMAND:
+            self._respond(False, received)
+
+
+    def _respond(self, delivered: bool, received: float):
+        if self._response is not None and not self._response.done():
+            self._response.set_result((delivered, received))
+
+
+    async def run(self):
+        while True:
+            command = await self._queue.get()
+            self._pending = command
+            try:
+                await self._transmit(command)
+            finally:
+                self._pending = None
+
+
+    async def _transmit(self, command: Command):
+        frame = _HEADER_BYTES + bytes([command.action, command.value])
+        status = CommandStatus.UNCONFIRMED
+
+        while command.attempts <= self._retries:
+            if command.attempts:
+                self._metrics.increment('commands', 'retries')
+            command.attempts += 1
+
+            self._response = asyncio.get_running_loop().create_future()
+            sent = time.perf_counter()
+            await self._writer.submit(self._serial.write, frame)
+
+            try:
+                delivered, received = await asyncio.wait_for(self._response, self._timeout)
+            except TimeoutError:
+                continue
+
+            if delivered:
+                round_trip = received - sent
+                self._metrics.observe('command', round_trip)
+                self._finish(command, CommandStatus.ACKNOWLEDGED, round_trip)
+                return
+            status = CommandStatus.FAILED
+
+        self._finish(command, status, None)
+
+
+    def _finish(self, command: Command, status: CommandStatus, round_trip: float | None):
+        self._metrics.increment('commands', status.value)
+        self._on_result(command, status, round_trip)
+
+
+    def summary(self) -> dict:
+        return {
+            'queued': self._queue.metrics.depth,
+            'pending': self._pending.name if self._pending is not None else None,
+            **{ status.value: self._metrics.count('commands', status.value) for status in CommandStatus },
+            'retries': self._metrics.count('commands', 'retries')
+        }
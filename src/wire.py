@@ -0,0 +1,94 @@
+import json
+from struct import Struct
+
+from .data import Vector, Data, DropData, toDictionary
+
+# Websocket subprotocols. Clients that do not ask for a subprotocol get one
+# JSON text message per sample, like before.
+BINARY_SUBPROTOCOL = 'cansat.binary.v1'
+JSON_SUBPROTOCOL = 'cansat.json'
+SUBPROTOCOLS = [BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL]
+
+# Binary message layout, all little-endian:
+#   kind (u8) | sample count (u16) | sample | sample | ...
+# and each sample:
+#   type (u8) | time (u32) | present fields (u16 bitmask) | values (f32)...
+# Only the fields with their bit set have values, in schema order. Vectors
+# have three values.
+_SAMPLES_MESSAGE = 1
+_MESSAGE_HEADER = Struct('<BH')
+_SAMPLE_HEADER = Struct('<BIH')
+
+_SAMPLE_TYPES = { Data: 0, DropData: 1 }
+_FIELDS = [
+    'acceleration',
+    'gyroscope',
+    'temperature_outside',
+    'distance',
+    'air_quality',
+    'sound',
+    'temperature_inside',
+    'humidity_inside',
+    'humidity_outside'
+]
+_VECTOR_FIELDS = ['acceleration', 'gyroscope']
+
+
+def schema_message() -> str:
+    return json.dumps({
+        'type': 'schema',
+        'protocol': BINARY_SUBPROTOCOL,
+        'sample_types': ['data', 'drop'],
+        'fields': [
+            { 'name': name, 'components': ['x', 'y', 'z'] if name in _VECTOR_FIELDS else [] }
+            for name in _FIELDS
+        ]
+    })
+
+
+def _pack_sample(data: Data | DropData) -> bytes:
+    present = 0
+    values = []
+    for bit, name in enumerate(_FIELDS):
+        value = getattr(data, name, None)
+        if value is None:
+            continue
+        present |= 1 << bit
+        if type(value) is Vector:
+            values += (value.x, value.y, value.z)
+        else:
+            values.append(value)
+
+    header = _SAMPLE_HEADER.pack(_SAMPLE_TYPES[type(data)], data.time, present)
+    return header + Struct(f'<{len(values)}f').pack(*values)
+
+
+# A processed sample on its way to the clients. Each encoding is made at most
+# once no matter how many clients receive it. received is the perf_counter()
+# time its bytes were read from the serial port, if known.
+class Sample:
+    __slots__ = ('data', 'received', '_json', '_packed')
+
+
+    def __init__(self, data: Data | DropData, received: float = None):
+        self.data = data
+        self.received = received
+        self._json: str = None
+        self._packed: bytes = None
+
+
+    def json(self) -> str:
+        if self._json is None:
+            self._json = json.dumps(toDictionary(self.data))
+        return self._json
+
+
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = _pack_sample(self.data)
+        return self._packed
+
+
+def encode_batch(samples: list[Sample]) -> bytes:
+    header = _MESSAGE_HEADER.pack(_SAMPLES_MESSAGE, len(samples))
+    return header + b''.join(sample.packed() for sample in samples)
@@ -0,0 +1,125 @@
+import csv
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import time
+
+
+@dataclass
+class FlushPolicy:
+    # Flush when this many rows are waiting across all channels.
+    max_rows: int = 256
+    # Flush when the oldest waiting row is older than this.
+    max_delay_seconds: float = 1.0
+    # Force the flushed rows to disk this often. Zero disables checkpoints.
+    sync_interval_seconds: float = 10.0
+
+
+class ChannelWriter:
+    def __init__(self, path: Path, fieldnames: list[str]):
+        self._file = path.open('w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(fieldnames)
+        self._rows: list[tuple] = []
+
+
+    def write(self, row: tuple):
+        self._rows.append(row)
+
+
+    def flush(self):
+        if self._rows:
+            self._writer.writerows(self._rows)
+            self._rows.clear()
+        self._file.flush()
+
+
+    def sync(self):
+        self.flush()
+        os.fsync(self._file.fileno())
+
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+class TelemetryWriter:
+    def __init__(self, policy: FlushPolicy = None):
+        self._policy = policy or FlushPolicy()
+        self._channels: dict[str, ChannelWriter] = {}
+
+        self._pending_rows = 0
+        self._oldest_pending_time: float = None
+        self._last_sync_time = time.monotonic()
+        self._closed = False
+
+
+    @property
+    def policy(self):
+        return self._policy
+
+
+    def open_channel(self, name: str, path: Path, fieldnames: list[str]):
+        self.add_channel(name, ChannelWriter(path, fieldnames))
+
+
+    # Any object with write(row), flush(), sync() and close() can be added as
+    # a channel, which lets other storage formats share the flush policy.
+    def add_channel(self, name: str, channel):
+        self._channels[name] = channel
+
+
+    def write(self, channel: str, row: tuple):
+        self._channels[channel].write(row)
+
+        self._pending_rows += 1
+        if self._oldest_pending_time is None:
+            self._oldest_pending_time = time.monotonic()
+
+        if self._pending_rows >= self._policy.max_rows:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+
+    def flush_if_due(self):
+        if self._oldest_pending_time is None:
+            return
+
+        now = time.monotonic()
+        if now - self._oldest_pending_time >= self._policy.max_delay_seconds:
+            self.flush(now)
+
+
+    def flush(self, now: float = None):
+        for channel in self._channels.values():
+            channel.flush()
+
+        self._pending_rows = 0
+        self._oldest_pending_time = None
+
+        now = now or time.monotonic()
+        interval = self._policy.sync_interval_seconds
+        if interval and now - self._last_sync_time >= interval:
+            self.sync(now)
+
+
+    def sync(self, now: float = None):
+        for channel in self._channels.values():
+            channel.sync()
+
+        self._pending_rows = 0
+        self._oldest_pending_time = None
+        self._last_sync_time = now or time.monotonic()
+
+
+    def close(self):
+        if self._closed:
+            return
+
+        for channel in self._channels.values():
+            channel.close()
+
+        self._closed = True
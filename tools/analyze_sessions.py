@@ -0,0 +1,64 @@
+import argparse
+import json
+from pathlib import Path
+import sys
+import time
+
+from src.analysis import analyze_sessions, find_sessions
+
+# Run from the repository root with:
+#   python -m tools.analyze_sessions [session or data directory]... [--json FILE]
+
+
+def format_number(value: float | None, unit: str = '') -> str:
+    return '-' if value is None else f'{value:.2f}{unit}'
+
+
+def print_report(report: dict):
+    print(report['session'])
+    print(f"  {report['samples']} samples over {report['duration'] / 1000:.1f} s")
+
+    drop = report['drop']
+    if drop is None:
+        print('  No drop detected.')
+    else:
+        landing = '-' if drop['landing'] is None else f"{drop['landing'] / 1000:.2f} s"
+        print(f"  Drop at {drop['start'] / 1000:.2f} s, landing at {landing}, peak {format_number(drop['peak_acceleration'], ' m/s^2')}")
+
+    rate = report['descent_rate']
+    if rate is not None:
+        print(f"  Descent rate {format_number(rate['mean'], ' m/s')}, median {format_number(rate['median'], ' m/s')}")
+
+    for channel, summary in report['channels'].items():
+        if summary is not None:
+            print(f"  {channel}: {summary['minimum']:.2f} to {summary['maximum']:.2f}, mean {summary['mean']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=sys.argv[0])
+    parser.add_argument('paths', nargs='+', type=Path, help='session directories, or directories of sessions')
+    parser.add_argument('--json', type=Path, metavar='FILE', help='save the reports to this file')
+    parser.add_argument('--profiles', action='store_true', help='include temperature and humidity profiles in the reports')
+    parser.add_argument('--workers', type=int, help='number of worker processes')
+    arguments = parser.parse_args()
+
+    sessions = [session for path in arguments.paths for session in find_sessions(path)]
+    if not sessions:
+        print('No sessions found.', file=sys.stderr)
+        return
+
+    started = time.perf_counter()
+    reports = analyze_sessions(sessions, arguments.profiles, arguments.workers)
+    duration = time.perf_counter() - started
+
+    for report in reports:
+        print_report(report)
+    print(f'Analyzed {len(reports)} sessions in {duration:.2f} s.')
+
+    if arguments.json:
+        with arguments.json.open('w') as file:
+            json.dump(reports, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
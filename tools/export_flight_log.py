@@ -0,0 +1,52 @@
+import csv
+import math
+from pathlib import Path
+import sys
+
+from src.flight_log import DATA_LOG_NAME, DROP_LOG_NAME, read_flight_log
+
+# Run from the repository root with:
+#   python -m tools.export_flight_log [session directory or .bin file] [output directory]
+
+
+def export_flight_log(log_path: Path, output_path: Path):
+    records = read_flight_log(log_path)
+    fieldnames = list(records.dtype.names)
+
+    with output_path.open('w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(fieldnames)
+        # Missing values are stored as NaN and exported as empty cells.
+        writer.writerows(
+            ['' if isinstance(value, float) and math.isnan(value) else value for value in row]
+            for row in records.tolist()
+        )
+
+
+def main():
+    try:
+        source = Path(sys.argv[1])
+    except IndexError:
+        print(f'Usage: {sys.argv[0]} [session directory or .bin file] [output directory]', file=sys.stderr)
+        return
+
+    if source.is_dir():
+        logs = [source / DATA_LOG_NAME, source / DROP_LOG_NAME]
+        default_output = source
+    else:
+        logs = [source]
+        default_output = source.parent
+
+    output = Path(sys.argv[2]) if len(sys.argv) > 2 else default_output
+    output.mkdir(parents=True, exist_ok=True)
+
+    for log in logs:
+        if not log.exists():
+            continue
+        destination = output / f'{log.stem}_log.csv'
+        export_flight_log(log, destination)
+        print(f'{log} -> {destination}')
+
+
+if __name__ == '__main__':
+    main()
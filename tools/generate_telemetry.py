@@ -0,0 +1,72 @@
+import argparse
+import os
+from pathlib import Path
+import sys
+import time
+import tty
+
+from src.capture import write_capture
+from src.generator import TelemetryGenerator
+
+# Generates telemetry like the ground station Arduino sends it. Either writes a
+# capture file to run the station with --replay, or plays the frames in real
+# time into a pseudo-terminal that the station opens as its COM port. Run from
+# the repository root with:
+#   python -m tools.generate_telemetry --capture FILE [options]
+#   python -m tools.generate_telemetry --pty [options]
+
+
+def play_to_pty(generator: TelemetryGenerator, duration: int, speed: float):
+    controller, device = os.openpty()
+    # Pass the bytes through untouched.
+    tty.setraw(device)
+    print(f'Sending to {os.ttyname(device)}, start the station with that port.')
+
+    start = time.perf_counter()
+    try:
+        for timestamp, frame in generator.frames(duration):
+            delay = timestamp / 1000 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            os.write(controller, frame)
+    finally:
+        os.close(controller)
+        os.close(device)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=sys.argv[0])
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--capture', type=Path, metavar='FILE', help='write a capture file')
+    output.add_argument('--pty', action='store_true', help='play the frames in real time into a pseudo-terminal')
+    parser.add_argument('--duration', type=float, default=60, help='seconds of telemetry')
+    parser.add_argument('--data-rate', type=float, default=100, help='DATA frames per second')
+    parser.add_argument('--drop-rate', type=float, default=0, help='DROP frames per second')
+    parser.add_argument('--text-rate', type=float, default=0, help='TEXT frames per second')
+    parser.add_argument('--noise', type=float, default=0.01, help='noise relative to the range of each sensor')
+    parser.add_argument('--corruption', type=float, default=0, help='fraction of frames with a flipped bit')
+    parser.add_argument('--checksum', action='store_true', help='send checked frames')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed of --pty relative to real time')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    generator = TelemetryGenerator(
+        arguments.data_rate, arguments.drop_rate, arguments.text_rate,
+        arguments.noise, arguments.corruption, arguments.checksum, arguments.seed
+    )
+    duration = int(arguments.duration * 1000)
+
+    if arguments.pty:
+        try:
+            play_to_pty(generator, duration, arguments.speed)
+        except KeyboardInterrupt:
+            pass
+    else:
+        write_capture(arguments.capture, (
+            (timestamp / 1000, frame) for timestamp, frame in generator.frames(duration)
+        ))
+        print(f'Wrote {arguments.capture}')
+
+
+if __name__ == '__main__':
+    main()